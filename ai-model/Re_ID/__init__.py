@@ -1,2 +1,2 @@
 from .reid_model import ReIDModel
-from .track_postprocess import filter_short_lived_ids, extract_embedding, reid_merge_tracks, keep_top_22_ids
\ No newline at end of file
+from .track_postprocess import filter_short_lived_ids, crop_bbox, extract_embedding, sample_track_crops, track_embeddings, reid_merge_tracks, keep_top_22_ids
\ No newline at end of file
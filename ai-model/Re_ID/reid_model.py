@@ -1,12 +1,14 @@
+import hashlib
+import threading
 import torch
 import torchreid
-from torchvision import transforms
 import cv2
 import numpy as np
+from utils.device_utils import select_device
 
 class ReIDModel:
-    def __init__(self, device='cuda'):
-        self.device = device if torch.cuda.is_available() else 'cpu'
+    def __init__(self, device='auto', batch_size=32):
+        self.device = select_device(device)
         
         self.model = torchreid.models.build_model(
             name='osnet_ain_x1_0', num_classes=1000, pretrained=True
@@ -14,26 +16,54 @@ class ReIDModel:
         self.model.to(self.device)
         self.model.eval()
 
-        
-        self.transform = transforms.Compose([
-            transforms.ToPILImage(),              
-            transforms.Resize((256, 128)),          
-            transforms.ToTensor(),                  
-            transforms.Normalize(mean=[0.485, 0.456, 0.406],
-                                 std=[0.229, 0.224, 0.225]),  
-        ])
+        self.batch_size = batch_size
+        self.input_size = (256, 128)    # (height, width) expected by OSNet
+        self.embedding_dim = getattr(self.model, 'feature_dim', 512)
+        self.mean = np.array([0.485, 0.456, 0.406], dtype=np.float32)
+        self.std = np.array([0.229, 0.224, 0.225], dtype=np.float32)
+        self._weights_hash = None
+        # one instance serves every job; the model is not thread-safe, so batches run one at a time
+        self.lock = threading.Lock()
+
+    def warmup(self):
+        # one dummy crop so the first job does not pay for lazy initialisation
+        self.extract_embeddings([np.zeros((*self.input_size, 3), dtype=np.uint8)])
+
+    def weights_hash(self):
+        # content hash of the loaded OSNet weights, so cached Re-ID results follow a weights update
+        if self._weights_hash is None:
+            digest = hashlib.sha256(b'osnet_ain_x1_0')
+            for name, tensor in self.model.state_dict().items():
+                digest.update(name.encode())
+                digest.update(tensor.detach().cpu().contiguous().numpy().tobytes())
+            self._weights_hash = digest.hexdigest()[:16]
+        return self._weights_hash
+
+    def preprocess_crops(self, crops):
+        # BGR uint8 crops -> normalized RGB float32 batch of shape (N, 3, H, W)
+        height, width = self.input_size
+        batch = np.empty((len(crops), height, width, 3), dtype=np.float32)
+        for i, crop in enumerate(crops):
+            batch[i] = cv2.resize(crop, (width, height), interpolation=cv2.INTER_LINEAR)
+        batch = batch[..., ::-1] / 255.0
+        batch = (batch - self.mean) / self.std
+        return np.ascontiguousarray(batch.transpose(0, 3, 1, 2), dtype=np.float32)
+
+    def extract_embeddings(self, crops):
+        # empty crops keep a zero embedding so rows stay aligned with the input
+        embeddings = np.zeros((len(crops), self.embedding_dim), dtype=np.float32)
+        valid = [i for i, crop in enumerate(crops) if crop is not None and crop.size > 0]
+        with self.lock, torch.inference_mode():
+            for start in range(0, len(valid), self.batch_size):
+                idx = valid[start:start + self.batch_size]
+                batch = torch.from_numpy(self.preprocess_crops([crops[i] for i in idx])).to(self.device)
+                embeddings[idx] = self.model(batch).float().cpu().numpy()
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        np.divide(embeddings, norms, out=embeddings, where=norms > 0)
+        return embeddings
 
     def extract_embedding(self, image):
-        
-        image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-        input_tensor = self.transform(image_rgb).unsqueeze(0).to(self.device)
-        with torch.no_grad():
-            embedding = self.model(input_tensor)
-        embedding = embedding.cpu().numpy().flatten()
-        norm = np.linalg.norm(embedding)
-        if norm > 0:
-            embedding = embedding / norm
-        return embedding
+        return self.extract_embeddings([image])[0]
 
 def preprocess(crop):
    
@@ -1,8 +1,7 @@
 from collections import Counter
 import numpy as np
-import cv2
-from sklearn.metrics.pairwise import cosine_similarity
-from .reid_model import ReIDModel, preprocess
+from scipy.sparse import csr_matrix
+from .reid_model import preprocess
 
 def filter_short_lived_ids(tracks, min_frames=50):
   
@@ -16,46 +15,147 @@ def filter_short_lived_ids(tracks, min_frames=50):
         filtered = {pid: info for pid, info in frame_data.items() if pid in valid_ids}
         tracks["players"][idx] = filtered
 
-def extract_embedding(frame, bbox, reid_model):
-    
+def crop_bbox(frame, bbox):
+    # copy so the crop does not keep the whole decoded frame alive
     x1, y1, x2, y2 = map(int, bbox)
-    crop = frame[y1:y2, x1:x2]
-    if crop.size == 0:
-       
-        return np.zeros(128)
-    processed = preprocess(crop)
-    embedding = reid_model.extract_embedding(processed)
-    return embedding
-
-def reid_merge_tracks(tracks, video_frames, reid_model, threshold=0.7):
-  
-    track_embeddings = {}
+    return frame[max(y1, 0):y2, max(x1, 0):x2].copy()
 
+def extract_embedding(frame, bbox, reid_model):
     
+    processed = preprocess(crop_bbox(frame, bbox))
+    return reid_model.extract_embeddings([processed])[0]
+
+def co_occurrence_matrix(tracks, pids):
+    # (N, N) bool: True where two tracks are ever visible in the same frame
+    index = {pid: i for i, pid in enumerate(pids)}
+    rows, cols = [], []
     for frame_idx, frame_data in enumerate(tracks["players"]):
-        frame = video_frames[frame_idx]
-        for pid, info in frame_data.items():
-            if pid not in track_embeddings:
-                embedding = extract_embedding(frame, info['bbox'], reid_model)
-                track_embeddings[pid] = embedding
+        for pid in frame_data:
+            if pid in index:
+                rows.append(frame_idx)
+                cols.append(index[pid])
+    presence = csr_matrix(
+        (np.ones(len(rows), dtype=np.float32), (rows, cols)),
+        shape=(len(tracks["players"]), len(pids))
+    )
+    return (presence.T @ presence).toarray() > 0
 
-    
-    merge_mapping = {}  
-    pids = list(track_embeddings.keys())
-    for i in range(len(pids)):
-        for j in range(i + 1, len(pids)):
-            pid_i = pids[i]
-            pid_j = pids[j]
-            emb_i = track_embeddings[pid_i].reshape(1, -1)
-            emb_j = track_embeddings[pid_j].reshape(1, -1)
-            sim = cosine_similarity(emb_i, emb_j)[0][0]
-            if sim > threshold:
-                
-                canonical = min(pid_i, pid_j)
-                duplicate = max(pid_i, pid_j)
-                merge_mapping[duplicate] = canonical
+def merge_mapping_from_embeddings(tracks, pids, embeddings, threshold=0.7):
+    # pids are in order of first appearance; each merged group keeps its earliest ID
+    n = len(pids)
+    if n < 2:
+        return {}
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    embeddings = np.divide(embeddings, norms, out=np.zeros_like(embeddings), where=norms > 0)
+    similarity = embeddings @ embeddings.T
+
+    blocked = co_occurrence_matrix(tracks, pids)
+    candidates = np.argwhere(np.triu(similarity > threshold, k=1) & ~blocked)
+    order = np.argsort(-similarity[candidates[:, 0], candidates[:, 1]], kind="stable")
+
+    parent = np.arange(n)
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    # most similar pairs first; groups that would contain two co-visible tracks are never joined
+    for i, j in candidates[order]:
+        root_i, root_j = find(i), find(j)
+        if root_i == root_j or blocked[root_i, root_j]:
+            continue
+        keep, drop = min(root_i, root_j), max(root_i, root_j)
+        parent[drop] = keep
+        blocked[keep] |= blocked[drop]
+        blocked[:, keep] |= blocked[:, drop]
+
+    return {pids[i]: pids[find(i)] for i in range(n) if find(i) != i}
+
+def _occlusion(boxes):
+    # for each box, the largest fraction of its area covered by another box in the same frame
+    boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+    if len(boxes) < 2:
+        return np.zeros(len(boxes), dtype=np.float32)
+    x1 = np.maximum(boxes[:, None, 0], boxes[None, :, 0])
+    y1 = np.maximum(boxes[:, None, 1], boxes[None, :, 1])
+    x2 = np.minimum(boxes[:, None, 2], boxes[None, :, 2])
+    y2 = np.minimum(boxes[:, None, 3], boxes[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    np.fill_diagonal(inter, 0)
+    area = np.maximum((boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1]), 1e-6)
+    return np.minimum(inter.max(axis=1) / area, 1.0)
+
+def sample_track_crops(tracks, samples_per_track=5, max_embeddings=512):
+    # score = relative box area * detection confidence * (1 - occlusion); the best observation
+    # in each of K equal slices of the track's lifetime is kept -> {frame_idx: [(pid, bbox), ...]}
+    observations = {}
+    for frame_idx, frame_data in enumerate(tracks["players"]):
+        if not frame_data:
+            continue
+        pids = list(frame_data.keys())
+        boxes = [frame_data[pid]['bbox'] for pid in pids]
+        occlusion = _occlusion(boxes)
+        for pid, bbox, occ in zip(pids, boxes, occlusion):
+            conf = frame_data[pid].get('conf')
+            area = max(bbox[2] - bbox[0], 0) * max(bbox[3] - bbox[1], 0)
+            observations.setdefault(pid, []).append(
+                (frame_idx, bbox, area, 0.5 if conf is None else conf, 1.0 - float(occ))
+            )
+
+    if not observations:
+        return {}
+    if len(observations) > max_embeddings:
+        # one crop each for the longest-lived tracks; the rest keep a zero descriptor and are not merged
+        longest = sorted(observations, key=lambda pid: len(observations[pid]), reverse=True)[:max_embeddings]
+        observations = {pid: observations[pid] for pid in longest}
+    k = max(1, min(samples_per_track, max_embeddings // len(observations)))
+
+    picks = {}
+    for pid, obs in observations.items():
+        frame_ids = np.array([o[0] for o in obs])
+        area = np.array([o[2] for o in obs], dtype=np.float32)
+        score = (area / max(area.max(), 1e-6)) * np.array([o[3] for o in obs]) * np.array([o[4] for o in obs])
+        span = frame_ids[-1] - frame_ids[0] + 1
+        bins = np.minimum((frame_ids - frame_ids[0]) * k // span, k - 1)
+        for b in np.unique(bins):
+            members = np.flatnonzero(bins == b)
+            best = members[np.argmax(score[members])]
+            picks.setdefault(int(frame_ids[best]), []).append((pid, obs[best][1]))
+    return picks
+
+def track_embeddings(tracks, video_frames, reid_model, samples_per_track=5, max_embeddings=512):
+    # one batched forward pass over every sampled crop, then a mean descriptor per track
+    picks = sample_track_crops(tracks, samples_per_track, max_embeddings)
+    crop_pids, crops = [], []
+    last_pick = max(picks, default=-1)
+    # video_frames may be a generator (e.g. utils.video_utils.iter_video), so frames are walked in order
+    for frame_idx, frame in enumerate(video_frames):
+        if frame_idx > last_pick:
+            break
+        for pid, bbox in picks.get(frame_idx, ()):
+            crop_pids.append(pid)
+            crops.append(preprocess(crop_bbox(frame, bbox)))
+
+    pids = list(dict.fromkeys(pid for frame_data in tracks["players"] for pid in frame_data))
+    index = {pid: i for i, pid in enumerate(pids)}
+    embeddings = reid_model.extract_embeddings(crops)
+    descriptors = np.zeros((len(pids), embeddings.shape[1]), dtype=np.float32)
+    rows = np.array([index[pid] for pid in crop_pids], dtype=np.int64)
+    # zero rows from empty crops add nothing to the sum, so they drop out of the mean direction
+    np.add.at(descriptors, rows, embeddings)
+    norms = np.linalg.norm(descriptors, axis=1, keepdims=True)
+    np.divide(descriptors, norms, out=descriptors, where=norms > 0)
+    return pids, descriptors
+
+def reid_merge_tracks(tracks, video_frames, reid_model, threshold=0.7,
+                      samples_per_track=5, max_embeddings=512):
+  
+    pids, embeddings = track_embeddings(tracks, video_frames, reid_model, samples_per_track, max_embeddings)
+    merge_mapping = merge_mapping_from_embeddings(tracks, pids, embeddings, threshold)
 
-    
     for idx in range(len(tracks["players"])):
         frame_data = tracks["players"][idx]
         new_frame_data = {}
@@ -1 +1 @@
-from .camera_movement_estimator import CameraMovementEstimator
\ No newline at end of file
+from .camera_movement_estimator import CameraMovementEstimator, estimate_camera_motion_parallel
\ No newline at end of file
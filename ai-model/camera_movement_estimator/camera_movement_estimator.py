@@ -1,23 +1,36 @@
-import pickle
 import cv2
 import numpy as np
 import os
 import sys
+import multiprocessing
+from typing import Optional
+from concurrent.futures import ProcessPoolExecutor
 sys.path.append('../')
-from utils.bbox_utils import measure_distance, measure_xy_distance, get_center_of_bbox, get_foot_position
+from utils.bbox_utils import get_center_of_bbox, get_foot_position
+from track_table import TrackTable
+
+# feature columns as fractions of the frame width (the old 0:20 and 900:1050 on 1920-wide frames)
+DEFAULT_MASK_COLUMNS = ((0.0, 20 / 1920), (900 / 1920, 1050 / 1920))
 
 class CameraMovementEstimator:
-    def __init__(self, frame: np.ndarray) -> None:
+    def __init__(self, frame: np.ndarray, scale: float = 0.5, method: str = "similarity",
+                 mask_columns: tuple = DEFAULT_MASK_COLUMNS) -> None:
         self.minimum_distance = 5
+        # optical flow runs on a downscaled grayscale frame; offsets are reported in full-resolution pixels
+        self.scale = scale
+        self.method = method                # "similarity" (RANSAC) or "median"
+        self.min_tracked_features = 10
         self.lk_params = dict(
             winSize=(15, 15),
             maxLevel=2,
             criteria=(cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 10, 0.03)
         )
-        first_gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        mask_features = np.zeros_like(first_gray)
-        mask_features[:, 0:20] = 1
-        mask_features[:, 900:1050] = 1
+        width = frame.shape[1]
+        mask_features = np.zeros(frame.shape[:2], dtype=np.uint8)
+        for start, stop in mask_columns:
+            mask_features[:, int(round(start * width)):int(round(stop * width))] = 1
+        mask_features = self._downscale(mask_features, cv2.INTER_NEAREST)
+        self.center = np.array(mask_features.shape[::-1], dtype=np.float32) / 2
 
         self.features = dict(
             maxCorners=100,
@@ -26,9 +39,48 @@ class CameraMovementEstimator:
             blockSize=7,
             mask=mask_features
         )
+        self.reset()
+
+    def _downscale(self, image: np.ndarray, interpolation: int = cv2.INTER_AREA) -> np.ndarray:
+        if self.scale == 1.0:
+            return image
+        return cv2.resize(image, None, fx=self.scale, fy=self.scale, interpolation=interpolation)
+
+    def _gray(self, frame: np.ndarray) -> np.ndarray:
+        return self._downscale(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY))
+
+    def estimate_motion(self, old_points: np.ndarray, new_points: np.ndarray) -> tuple:
+        # (dx, dy, zoom) from all tracked points at once; dx, dy = old - new at the image centre
+        if len(old_points) == 0:
+            return 0.0, 0.0, 1.0
+        if self.method == "similarity" and len(old_points) >= 3:
+            matrix, _ = cv2.estimateAffinePartial2D(
+                old_points, new_points, method=cv2.RANSAC, ransacReprojThreshold=1.0
+            )
+            if matrix is not None:
+                zoom = float(np.hypot(matrix[0, 0], matrix[1, 0]))
+                dx, dy = self.center - (matrix[:, :2] @ self.center + matrix[:, 2])
+                return float(dx), float(dy), zoom
+        dx, dy = np.median(old_points - new_points, axis=0)
+        old_spread = np.linalg.norm(old_points - np.median(old_points, axis=0), axis=1)
+        new_spread = np.linalg.norm(new_points - np.median(new_points, axis=0), axis=1)
+        valid = old_spread > 1e-3
+        zoom = float(np.median(new_spread[valid] / old_spread[valid])) if valid.any() else 1.0
+        return float(dx), float(dy), zoom
+
+    @staticmethod
+    def add_adjust_positions_to_tracks(tracks: dict, camera_movement_per_frame: list) -> None:
+        if isinstance(tracks, TrackTable):
+            missing = np.isnan(tracks.position).any(axis=1)
+            if missing.any():
+                x1, y1, x2, y2 = tracks.bbox[missing].T
+                is_ball = tracks.category_mask('ball')[missing]
+                tracks.position[missing, 0] = np.trunc((x1 + x2) / 2)
+                tracks.position[missing, 1] = np.where(is_ball, np.trunc((y1 + y2) / 2), np.trunc(y2))
+            offsets = np.asarray(camera_movement_per_frame, dtype=np.float32).reshape(-1, 2)
+            tracks.position_adjusted[:] = tracks.position - offsets[tracks.frame]
+            return
 
-    def add_adjust_positions_to_tracks(self, tracks: dict, camera_movement_per_frame: list) -> None:
-        
         from utils.bbox_utils import get_center_of_bbox, get_foot_position
         for category, frame_list in tracks.items():
             for fnum, track_dict in enumerate(frame_list):
@@ -46,50 +98,76 @@ class CameraMovementEstimator:
                     px, py = info['position']
                     info['position_adjusted'] = (px - dx, py - dy)
 
+    def reset(self) -> None:
+        self.old_gray = None
+        self.old_features = None
+
+    def update_camera_motion(self, frames: list) -> np.ndarray:
+        # (N, 3) rows of dx, dy, zoom; continues from the last frame seen by the previous call,
+        # so a video can be fed window by window
+        camera_motion = np.zeros((len(frames), 3), dtype=np.float32)
+        camera_motion[:, 2] = 1.0
+        if not frames:
+            return camera_motion
+        start = 0
+        if self.old_gray is None:
+            self.old_gray = self._gray(frames[0])
+            self.old_features = cv2.goodFeaturesToTrack(self.old_gray, **self.features)
+            start = 1
+        old_gray, old_features = self.old_gray, self.old_features
+
+        for fidx in range(start, len(frames)):
+            frame_gray = self._gray(frames[fidx])
+            tracked = None
+            if old_features is not None and len(old_features):
+                new_features, status, _ = cv2.calcOpticalFlowPyrLK(
+                    old_gray, frame_gray, old_features, None, **self.lk_params
+                )
+                if new_features is not None and status is not None:
+                    good = status.ravel() == 1
+                    old_points = old_features[good].reshape(-1, 2)
+                    tracked = new_features[good].reshape(-1, 2)
+                    dx, dy, zoom = self.estimate_motion(old_points, tracked)
+                    dx, dy = dx / self.scale, dy / self.scale
+                    camera_motion[fidx, 2] = zoom
+                    if np.hypot(dx, dy) > self.minimum_distance:
+                        camera_motion[fidx, :2] = (dx, dy)
+                        tracked = None
+
+            # keep following the surviving points; re-detect after a real move or when too few remain
+            if tracked is None or len(tracked) < self.min_tracked_features:
+                new_good = cv2.goodFeaturesToTrack(frame_gray, **self.features)
+                old_features = new_good if new_good is not None else old_features
+            else:
+                old_features = tracked.reshape(-1, 1, 2)
+            old_gray = frame_gray
+
+        self.old_gray, self.old_features = old_gray, old_features
+        return camera_motion
+
+    def update_camera_movement(self, frames: list) -> list:
+        return self.update_camera_motion(frames)[:, :2].tolist()
+
+    def get_camera_motion(self, frames: list) -> np.ndarray:
+        self.reset()
+        return self.update_camera_motion(frames)
+
     def get_camera_movement(self, frames: list, read_from_stub: bool = False, stub_path: str = None) -> list:
         
+        # stubs are (N, 2) float arrays in .npy format
         if read_from_stub and stub_path and os.path.exists(stub_path):
             try:
-                with open(stub_path, 'rb') as f:
-                    return pickle.load(f)
+                return np.load(stub_path).tolist()
             except Exception as e:
                 print(f"[WARN] Could not load camera stub: {e}")
 
-        n_frames = len(frames)
-        camera_movement = [[0, 0] for _ in range(n_frames)]
-        old_gray = cv2.cvtColor(frames[0], cv2.COLOR_BGR2GRAY)
-        old_features = cv2.goodFeaturesToTrack(old_gray, **self.features)
-
-        for fidx in range(1, n_frames):
-            frame_gray = cv2.cvtColor(frames[fidx], cv2.COLOR_BGR2GRAY)
-            new_features, status, _ = cv2.calcOpticalFlowPyrLK(
-                old_gray, frame_gray, old_features, None, **self.lk_params
-            )
-            max_dist = 0
-            cam_dx, cam_dy = 0, 0
-            if new_features is not None and status is not None:
-                for (n_pt, o_pt, st) in zip(new_features, old_features, status):
-                    if st == 1:
-                        np_new = n_pt.ravel()
-                        np_old = o_pt.ravel()
-                        dist = ((np_new[0]-np_old[0])**2 + (np_new[1]-np_old[1])**2) ** 0.5
-                        if dist > max_dist:
-                            max_dist = dist
-                            dx = np_old[0] - np_new[0]
-                            dy = np_old[1] - np_new[1]
-                            cam_dx, cam_dy = dx, dy
-
-            if max_dist > self.minimum_distance:
-                camera_movement[fidx] = [cam_dx, cam_dy]
-                new_good = cv2.goodFeaturesToTrack(frame_gray, **self.features)
-                if new_good is not None:
-                    old_features = new_good
-            old_gray = frame_gray.copy()
+        self.reset()
+        camera_movement = self.update_camera_movement(frames)
 
         if stub_path:
             try:
                 with open(stub_path, 'wb') as f:
-                    pickle.dump(camera_movement, f)
+                    np.save(f, np.asarray(camera_movement, dtype=np.float32).reshape(-1, 2))
             except Exception as e:
                 print(f"[WARN] Could not save camera stub: {e}")
 
@@ -111,3 +189,79 @@ class CameraMovementEstimator:
                         cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 0), 3)
             output_frames.append(fcopy)
         return output_frames
+
+def _thumbnail(frame: np.ndarray) -> np.ndarray:
+    return cv2.resize(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY), (32, 18), interpolation=cv2.INTER_AREA)
+
+def _estimate_chunk(video_path: str, start: int, stop: int, overlap: int, window_size: int,
+                    estimator_kwargs: dict) -> tuple:
+    # decodes [start - overlap, stop) window by window; the overlap warms up the feature set so the
+    # first frame of the chunk is measured against its true predecessor, and its rows are dropped.
+    # Also returns thumbnails of the overlap frames and of the chunk's last overlap frames, so the
+    # caller can check that the seek landed on the frame the previous chunk decoded.
+    cv2.setNumThreads(1)
+    first = max(0, start - overlap)
+    cap = cv2.VideoCapture(video_path)
+    cap.set(cv2.CAP_PROP_POS_FRAMES, first)
+    estimator, motion, window = None, [], []
+    head, tail = [], []
+    for frame_idx in range(first, stop):
+        ret, frame = cap.read()
+        if not ret:
+            break
+        if frame_idx < start:
+            head.append(_thumbnail(frame))
+        elif frame_idx >= stop - overlap:
+            tail.append(_thumbnail(frame))
+        window.append(frame)
+        if len(window) == window_size:
+            estimator = estimator or CameraMovementEstimator(window[0], **estimator_kwargs)
+            motion.append(estimator.update_camera_motion(window))
+            window = []
+    if window:
+        estimator = estimator or CameraMovementEstimator(window[0], **estimator_kwargs)
+        motion.append(estimator.update_camera_motion(window))
+    cap.release()
+    motion = np.concatenate(motion) if motion else np.zeros((0, 3), dtype=np.float32)
+    return motion[start - first:], head, tail
+
+def estimate_camera_motion_parallel(video_path: str, chunk_size: int = 1000, overlap: int = 5,
+                                    max_workers: int = None, window_size: int = 32,
+                                    max_thumbnail_diff: float = 2.0,
+                                    **estimator_kwargs) -> Optional[np.ndarray]:
+    # Splits the video into chunks estimated in separate processes. Rows are per-frame deltas, so
+    # stitching is concatenation: every chunk owns [start, stop) and its first row is measured from
+    # frame start - 1. Each chunk re-detects its features after the overlap warm-up instead of
+    # following the points of the previous chunk, so rows near a boundary can differ slightly from
+    # the sequential pass. Seeking is not frame-accurate for every codec: if a chunk's overlap frames
+    # do not match the end of the previous chunk, None is returned and callers fall back to the
+    # sequential estimator.
+    cap = cv2.VideoCapture(video_path)
+    n_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+    cap.release()
+    if n_frames == 0:
+        return np.zeros((0, 3), dtype=np.float32)
+
+    bounds = [(start, min(start + chunk_size, n_frames)) for start in range(0, n_frames, chunk_size)]
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=context) as pool:
+        futures = [
+            pool.submit(_estimate_chunk, video_path, start, stop, overlap, window_size, estimator_kwargs)
+            for start, stop in bounds
+        ]
+        chunks = [future.result() for future in futures]
+
+    for (start, _), (_, _, tail), (_, head, _) in zip(bounds[1:], chunks[:-1], chunks[1:]):
+        expected = tail[len(tail) - len(head):] if head else []
+        aligned = len(head) == min(overlap, start) and len(expected) == len(head) and all(
+            np.abs(a.astype(np.int16) - b.astype(np.int16)).mean() <= max_thumbnail_diff
+            for a, b in zip(head, expected)
+        )
+        if not aligned:
+            print(f"[WARN] Seek to frame {start} is not frame-accurate, camera motion needs a sequential pass")
+            return None
+
+    motion = np.concatenate([chunk[0] for chunk in chunks])
+    if len(motion):
+        motion[0] = (0.0, 0.0, 1.0)
+    return motion
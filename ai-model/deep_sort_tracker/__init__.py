@@ -1 +1,3 @@
-from .deep_sort_tracker import DeepSortTracker
\ No newline at end of file
+from .deep_sort_tracker import DeepSortTracker, detections_to_arrays, keyframe_source
+from .detection_cache import DetectionCache
+from .track_metrics import id_stability
\ No newline at end of file
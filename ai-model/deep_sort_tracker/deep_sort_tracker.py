@@ -1,12 +1,43 @@
 import os
-import pickle
+import copy
+import hashlib
+import threading
 import numpy as np
-import pandas as pd
-import cv2
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Callable
+from scipy.interpolate import CubicSpline
 from ultralytics import YOLO
-import supervision as sv
 from deep_sort_realtime.deepsort_tracker import DeepSort
+from .detection_cache import DetectionCache
+from track_table import TrackTable, CATEGORIES
+from utils.device_utils import select_device, set_cpu_threads, adaptive_batch_size
+
+# where ultralytics writes each export format, relative to the weights' stem
+CPU_BACKENDS = {"openvino": "_openvino_model", "onnx": ".onnx"}
+
+class _LockedEmbedder:
+    # DeepSort's appearance embedder, shared by every fork of a tracker. Its torch model is no more
+    # thread-safe than the detector, so predict() is serialized the way predict_lock guards YOLO.
+
+    def __init__(self, embedder: Any) -> None:
+        self.embedder = embedder
+        self.lock = threading.Lock()
+
+    def predict(self, *args, **kwargs):
+        with self.lock:
+            return self.embedder.predict(*args, **kwargs)
+
+    def __getattr__(self, name: str) -> Any:
+        if name == "embedder":
+            raise AttributeError(name)
+        return getattr(self.embedder, name)
+
+def keyframe_source(camera_motion: Optional[np.ndarray]) -> str:
+    # names the input adaptive keyframes were picked from, for detection cache keys: a content hash of
+    # the camera motion, or "stride" when there was none and keyframes fell back to the fixed stride
+    if camera_motion is None:
+        return "stride"
+    motion = np.ascontiguousarray(camera_motion, dtype=np.float64)
+    return hashlib.sha256(motion.tobytes()).hexdigest()[:16]
 
 def clamp_bbox(bbox: List[float], frame_width: int, frame_height: int) -> List[float]:
     x1, y1, x2, y2 = bbox
@@ -16,54 +47,281 @@ def clamp_bbox(bbox: List[float], frame_width: int, frame_height: int) -> List[f
     y2 = max(0, min(y2, frame_height - 1))
     return [x1, y1, x2, y2]
 
+def detections_to_arrays(results: List[Any]) -> List[np.ndarray]:
+    # compact per-frame detections: (N, 6) rows of x1, y1, x2, y2, conf, cls
+    # None marks a frame that was skipped by the detection stride and is passed through
+    arrays = []
+    for result in results:
+        if result is None:
+            arrays.append(None)
+            continue
+        if isinstance(result, np.ndarray):
+            arrays.append(result.reshape(-1, 6).astype(np.float32))
+            continue
+        boxes = result.boxes
+        arrays.append(np.hstack([
+            boxes.xyxy.cpu().numpy().reshape(-1, 4),
+            boxes.conf.cpu().numpy().reshape(-1, 1),
+            boxes.cls.cpu().numpy().reshape(-1, 1),
+        ]).astype(np.float32))
+    return arrays
+
+INTERPOLATED_FIELDS = ("bbox", "position", "position_adjusted", "position_transformed")
+
+def interpolate_gaps(known: np.ndarray, series: Dict[str, np.ndarray], max_gap: int,
+                     method: str = "linear") -> tuple:
+    # ({name: (M, D) values}, (M,) frame indices) for the missing frames inside gaps of <= max_gap frames
+    measured = np.flatnonzero(known)
+    if len(measured) < 2:
+        return {name: values[:0] for name, values in series.items()}, np.zeros(0, dtype=np.int64)
+    gaps = np.diff(measured) - 1
+    fillable = (gaps > 0) & (gaps <= max_gap)
+    frames = np.concatenate([np.arange(start + 1, start + 1 + gap)
+                             for start, gap in zip(measured[:-1][fillable], gaps[fillable])] or
+                            [np.zeros(0, dtype=np.int64)])
+    # measured frames on either side of each filled frame
+    right = measured[np.searchsorted(measured, frames)]
+    left = measured[np.searchsorted(measured, frames) - 1]
+    filled = {}
+    for name, values in series.items():
+        result = np.full((len(frames),) + values.shape[1:], np.nan)
+        for dim in range(values.shape[1]):
+            valid = measured[~np.isnan(values[measured, dim])]
+            if len(valid) < 2 or len(frames) == 0:
+                continue
+            if method == "cubic" and len(valid) >= 4:
+                result[:, dim] = CubicSpline(valid, values[valid, dim])(frames)
+            else:
+                result[:, dim] = np.interp(frames, valid, values[valid, dim])
+            # a field missing on either side of the gap is not bridged from further away
+            result[np.isnan(values[left, dim]) | np.isnan(values[right, dim]), dim] = np.nan
+        filled[name] = result
+    return filled, frames
+
+def export_cpu_model(model_path: str, backend: str = "openvino", imgsz: int = 640) -> str:
+    # exports the weights once for CPU inference and reuses the export until the weights change;
+    # dynamic axes let the same export serve any batch size and input resolution
+    exported = os.path.splitext(model_path)[0] + CPU_BACKENDS[backend]
+    if os.path.exists(exported) and os.path.getmtime(exported) >= os.path.getmtime(model_path):
+        return exported
+    return YOLO(model_path).export(format=backend, imgsz=imgsz, dynamic=True, half=False)
+
 class DeepSortTracker:
 
-    def __init__(self, model_path: str, device: str = 'cuda') -> None:
-        self.model = YOLO(model_path)
-        self.device = device
-        self.deepsort = DeepSort(
+    def __init__(self, model_path: Optional[str], device: Optional[str] = 'auto', imgsz: int = 640,
+                 cpu_threads: Optional[int] = None, cpu_backend: Optional[str] = "openvino",
+                 batch_size: Optional[int] = None, detection_stride: int = 1, adaptive_stride: bool = True,
+                 motion_budget: float = 24.0, embedder: Any = "default") -> None:
+        # model_path None: tracking only, on detections from elsewhere; no detector is loaded or exported.
+        # embedder replaces DeepSort's appearance model with any object whose predict(crops) returns
+        # one feature vector per crop (None: no appearance features)
+        self.model_path = model_path
+        self.device = select_device(device)
+        # detector input size (multiple of 32); lower values trade small-object recall for speed
+        self.imgsz = imgsz
+        self.backend = "torch"
+        model_file = model_path
+        if self.device == "cpu":
+            self.cpu_threads = set_cpu_threads(cpu_threads)
+            if cpu_backend and model_path is not None:
+                try:
+                    model_file = export_cpu_model(model_path, cpu_backend, imgsz)
+                    self.backend = cpu_backend
+                except Exception as e:
+                    print(f"[WARN] Could not export {model_path} to {cpu_backend}, using PyTorch on cpu: {e}")
+        self.model = YOLO(model_file, task="detect") if model_path is not None else None
+        # None: as many frames as fit in half of the free device memory
+        self.batch_size = batch_size or adaptive_batch_size(self.device, imgsz)
+        self.conf = 0.1
+        # ultralytics predictors are not thread-safe; forks of this tracker share the model and this lock
+        self.predict_lock = threading.Lock()
+        gpu = self.device.startswith("cuda")
+        self.detection_stride = max(1, int(detection_stride))
+        self.deepsort_params = dict(
             max_iou_distance=0.7,
             max_cosine_distance=0.4,
-            max_age=30,
-            n_init=3
+            # DeepSort counts detected frames, so a lost track is kept for about 30 frames at any stride
+            max_age=-(-30 // self.detection_stride),
+            n_init=3,
+            embedder_gpu=gpu,
+            half=gpu
         )
+        if embedder == "default":
+            self.deepsort = DeepSort(**self.deepsort_params)
+        else:
+            self.deepsort = DeepSort(**self.deepsort_params, embedder=None)
+            self.deepsort.embedder = embedder
+        if self.deepsort.embedder is not None:
+            self.deepsort.embedder = _LockedEmbedder(self.deepsort.embedder)
+
+        # Detection runs on keyframes at most detection_stride frames apart; DeepSort's Kalman filter
+        # predicts the boxes in between. With adaptive_stride a keyframe also comes as soon as the camera
+        # has moved motion_budget pixels since the last one, so fast pans are detected every frame.
+        self.adaptive_stride = adaptive_stride
+        self.motion_budget = motion_budget
+        self.reset_keyframes()
+
+    def reset_keyframes(self) -> None:
+        # keyframe selection and tracking continue across calls, so a video can be fed window by window
+        self.keyframe_gap, self.keyframe_motion = -1, 0.0
 
-    def detect_frames(self, frames: List[np.ndarray]) -> List[Any]:
-        batch_size = 20
-        detections = []
-        for i in range(0, len(frames), batch_size):
-            batch = frames[i: i + batch_size]
-            results = self.model.predict(batch, conf=0.1, device=self.device)
-            detections.extend(results)
+    def fork(self) -> "DeepSortTracker":
+        # fresh DeepSort state (one per job) on top of this tracker's detector and appearance embedder
+        tracker = copy.copy(self)
+        tracker.deepsort = DeepSort(**self.deepsort_params, embedder=None)
+        tracker.deepsort.embedder = self.deepsort.embedder
+        tracker.reset_keyframes()
+        return tracker
+
+    def warmup(self) -> None:
+        # one dummy batch so the first job does not pay for lazy initialisation (CUDA context, graph compile)
+        frame = np.zeros((self.imgsz, self.imgsz, 3), dtype=np.uint8)
+        self.detect_frames([frame])
+        if self.deepsort.embedder is not None:
+            self.deepsort.embedder.predict([frame[:128, :64]])
+
+    def detection_params(self, keyframes: str = "stride") -> Dict[str, Any]:
+        # everything besides the video and weights that changes the detections; part of the cache key.
+        # With adaptive strides the keyframes depend on camera motion, named by keyframes (see keyframe_source)
+        params = {"conf": self.conf, "imgsz": self.imgsz, "backend": self.backend}
+        if self.detection_stride > 1:
+            params.update(stride=self.detection_stride, adaptive=self.adaptive_stride, motion_budget=self.motion_budget)
+            if self.adaptive_stride:
+                params["keyframes"] = keyframes
+        return params
+
+    def select_keyframes(self, n_frames: int, camera_motion: Optional[np.ndarray] = None) -> np.ndarray:
+        # (n_frames,) bool, True where the detector runs; camera_motion rows start with dx, dy in pixels
+        keyframes = np.zeros(n_frames, dtype=bool)
+        step = np.zeros(n_frames)
+        if self.adaptive_stride and camera_motion is not None and n_frames:
+            motion = np.asarray(camera_motion, dtype=np.float64).reshape(n_frames, -1)
+            step = np.hypot(motion[:, 0], motion[:, 1])
+        for i in range(n_frames):
+            gap, moved = self.keyframe_gap + 1, self.keyframe_motion + step[i]
+            if self.keyframe_gap < 0 or gap >= self.detection_stride or moved >= self.motion_budget:
+                keyframes[i] = True
+                gap, moved = 0, 0.0
+            self.keyframe_gap, self.keyframe_motion = gap, moved
+        return keyframes
+
+    def detect_frames(
+        self,
+        frames: List[np.ndarray],
+        progress: Optional[Callable[[float], None]] = None,
+        keyframes: Optional[np.ndarray] = None
+    ) -> List[Any]:
+        # one result per frame; frames outside keyframes are not detected and get None
+        selected = np.arange(len(frames)) if keyframes is None else np.flatnonzero(keyframes)
+        detections = [None] * len(frames)
+        for i in range(0, len(selected), self.batch_size):
+            idx = selected[i: i + self.batch_size]
+            with self.predict_lock:
+                results = self.model.predict([frames[j] for j in idx], conf=self.conf, imgsz=self.imgsz,
+                                             device=self.device, verbose=False)
+            for j, result in zip(idx, results):
+                detections[j] = result
+            if progress:
+                progress(min(i + self.batch_size, len(selected)) / len(selected))
+        return detections
+
+    def detect_video(
+        self,
+        video_path: str,
+        frames: List[np.ndarray],
+        cache: Optional[DetectionCache] = None,
+        progress: Optional[Callable[[float], None]] = None,
+        camera_motion: Optional[np.ndarray] = None
+    ) -> List[Optional[np.ndarray]]:
+        def detect() -> List[Optional[np.ndarray]]:
+            self.reset_keyframes()
+            keyframes = self.select_keyframes(len(frames), camera_motion)
+            return detections_to_arrays(self.detect_frames(frames, progress, keyframes))
+
+        if cache is None:
+            return detect()
+        key = cache.make_key(video_path, self.model_path, **self.detection_params(keyframe_source(camera_motion)))
+        detections = cache.get(key)
+        if detections is None:
+            detections = detect()
+            cache.put(key, detections)
         return detections
 
     def get_object_tracks(
         self,
         frames: List[np.ndarray],
+        detections: Optional[List[Any]] = None,
         read_from_stub: bool = False,
-        stub_path: Optional[str] = None
+        stub_path: Optional[str] = None,
+        camera_motion: Optional[np.ndarray] = None
     ) -> Dict[str, List[Dict[Any, Any]]]:
+        # stubs are TrackTable npz files (det_bbox is not kept)
         if read_from_stub and stub_path and os.path.exists(stub_path):
             try:
-                with open(stub_path, 'rb') as f:
-                    return pickle.load(f)
+                return TrackTable.load(stub_path).to_tracks()
             except Exception as e:
                 print(f"Error loading stub from {stub_path}: {e}")
 
+        tracks = self.track_frames(frames, detections, camera_motion)
+
+        if stub_path:
+            try:
+                with open(stub_path, 'wb') as f:
+                    TrackTable.from_tracks(tracks).save(f)
+            except Exception as e:
+                print(f"Error saving stub to {stub_path}: {e}")
+
+        return tracks
+
+    def track_frames(
+        self,
+        frames: List[np.ndarray],
+        detections: Optional[List[Any]] = None,
+        camera_motion: Optional[np.ndarray] = None
+    ) -> Dict[str, List[Dict[Any, Any]]]:
+        # DeepSort state is kept on the instance, so consecutive calls continue the same tracks.
+        # A None detection (skipped frame) only advances the Kalman states, not DeepSort's hit and miss
+        # counters, so association on the next keyframe works as if the frames in between did not exist.
         tracks = {"players": [], "referees": [], "ball": []}
-        detections = self.detect_frames(frames)
+        if detections is None:
+            detections = self.detect_frames(frames, keyframes=self.select_keyframes(len(frames), camera_motion))
+        detections = detections_to_arrays(detections)
         frame_h, frame_w = frames[0].shape[:2]
+        if camera_motion is not None:
+            camera_motion = np.asarray(camera_motion, dtype=np.float64).reshape(len(frames), -1)
 
         for frame_idx, detection in enumerate(detections):
-            # extract raw YOLO outputs as numpy arrays
-            raw_bboxes = detection.boxes.xyxy.cpu().numpy()    # shape (N,4)
-            raw_confs  = detection.boxes.conf.cpu().numpy()    # shape (N,)
-            raw_cls    = detection.boxes.cls.cpu().numpy()     # shape (N,)
+            if camera_motion is not None:
+                # move the predicted states with the camera (dx, dy = old - new image position)
+                dx, dy = camera_motion[frame_idx, :2]
+                if dx or dy:
+                    for track in self.deepsort.tracker.tracks:
+                        track.mean[0] -= dx
+                        track.mean[1] -= dy
+
+            if detection is None:
+                kf = self.deepsort.tracker.kf
+                frame_tracks = {"players": {}, "referees": {}, "ball": {}}
+                for t in self.deepsort.tracker.tracks:
+                    t.mean, t.covariance = kf.predict(t.mean, t.covariance)
+                    if not t.is_confirmed() or t.time_since_update > 1:
+                        continue
+                    box = clamp_bbox(t.to_tlbr().tolist(), frame_w, frame_h)
+                    self._add_entry(frame_tracks, t, {"bbox": box, "det_bbox": box, "conf": None, "predicted": True})
+                for category in tracks:
+                    tracks[category].append(frame_tracks[category])
+                continue
 
-            ds_input = []
+            raw_bboxes = detection[:, :4]    # shape (N,4)
+            raw_confs  = detection[:, 4]     # shape (N,)
+            raw_cls    = detection[:, 5]     # shape (N,)
+
+            # DeepSort takes left, top, width, height boxes
+            ds_input, clamped_boxes = [], []
             for det_idx, raw in enumerate(raw_bboxes):
-                clamped = clamp_bbox(raw.tolist(), frame_w, frame_h)
-                ds_input.append([clamped, float(raw_confs[det_idx]), int(raw_cls[det_idx])])
+                x1, y1, x2, y2 = clamp_bbox(raw.tolist(), frame_w, frame_h)
+                clamped_boxes.append([x1, y1, x2, y2])
+                ds_input.append([[x1, y1, x2 - x1, y2 - y1], float(raw_confs[det_idx]), int(raw_cls[det_idx])])
 
             outputs = self.deepsort.update_tracks(ds_input, frame=frames[frame_idx])
             frame_tracks = {"players": {}, "referees": {}, "ball": {}}
@@ -74,34 +332,38 @@ class DeepSortTracker:
 
                 ds_box = clamp_bbox(t.to_tlbr().tolist(), frame_w, frame_h)
                 det_idx = getattr(t, 'det_index', None)
-                raw_box = ds_input[det_idx][0] if det_idx is not None else ds_box
-
-                tid = t.track_id
-                cls = t.det_class
-
-                entry = {"bbox": ds_box, "det_bbox": raw_box}
+                raw_box = clamped_boxes[det_idx] if det_idx is not None else ds_box
 
-                if cls == 0:
-                    frame_tracks["ball"][1] = entry
-                elif cls in [1, 2]:
-                    frame_tracks["players"][tid] = entry
-                elif cls == 3:
-                    frame_tracks["referees"][tid] = entry
+                det_conf = getattr(t, 'det_conf', None)
+                entry = {"bbox": ds_box, "det_bbox": raw_box,
+                         "conf": float(det_conf) if det_conf is not None else None}
+                self._add_entry(frame_tracks, t, entry)
 
             tracks["players"].append(frame_tracks["players"])
             tracks["referees"].append(frame_tracks["referees"])
             tracks["ball"].append(frame_tracks["ball"])
 
-        if stub_path:
-            try:
-                with open(stub_path, 'wb') as f:
-                    pickle.dump(tracks, f)
-            except Exception as e:
-                print(f"Error saving stub to {stub_path}: {e}")
-
         return tracks
 
+    @staticmethod
+    def _add_entry(frame_tracks: Dict[str, Dict[int, Any]], t: Any, entry: Dict[str, Any]) -> None:
+        cls = t.det_class
+        if cls == 0:
+            frame_tracks["ball"][1] = entry
+        elif cls in [1, 2]:
+            frame_tracks["players"][int(t.track_id)] = entry
+        elif cls == 3:
+            frame_tracks["referees"][int(t.track_id)] = entry
+
     def add_position_to_tracks(self, tracks: Dict[str, List[Dict[Any, Any]]]) -> None:
+        if isinstance(tracks, TrackTable):
+            # same truncation as get_center_of_bbox / get_foot_position
+            x1, y1, x2, y2 = tracks.bbox.T
+            center_y = np.trunc((y1 + y2) / 2)
+            foot_y = np.trunc(y2)
+            tracks.position[:, 0] = np.trunc((x1 + x2) / 2)
+            tracks.position[:, 1] = np.where(tracks.category_mask('ball'), center_y, foot_y)
+            return
         from utils.bbox_utils import get_center_of_bbox, get_foot_position
         for cat, frames in tracks.items():
             for frame in frames:
@@ -113,8 +375,50 @@ class DeepSortTracker:
                     else:
                         info['position'] = get_foot_position(bbox)
 
-    def interpolate_ball_positions(self, ball_positions: List[Dict[Any, Any]]) -> List[Dict[Any, Any]]:        
-        bboxes = [f.get(1, {}).get('bbox', [0,0,0,0]) for f in ball_positions]
-        df = pd.DataFrame(bboxes, columns=['x1','y1','x2','y2'])
-        df = df.interpolate().bfill().ffill()
-        return [{1: {"bbox": row.tolist()}} for _, row in df.iterrows()]
+    def interpolate_ball_positions(self, ball_positions: List[Dict[Any, Any]], max_gap: int = 12,
+                                   method: str = "linear") -> List[Dict[Any, Any]]:
+        # Fills ball gaps of up to max_gap frames from the measured frames on both sides ("linear" or
+        # "cubic" spline); longer gaps and the ends of the video stay empty. Filled entries are flagged
+        # "interpolated". A TrackTable is filled in place, a per-frame dict list is returned filled.
+        if isinstance(ball_positions, TrackTable):
+            self._interpolate_ball_table(ball_positions, max_gap, method)
+            return ball_positions
+
+        n_frames = len(ball_positions)
+        known = np.array([1 in f for f in ball_positions], dtype=bool)
+        fields = [name for name in INTERPOLATED_FIELDS if any(name in f[1] for f in ball_positions if 1 in f)]
+        series = {}
+        for name in fields:
+            values = np.full((n_frames, 2 if name != "bbox" else 4), np.nan)
+            for frame_idx, f in enumerate(ball_positions):
+                if 1 in f and name in f[1]:
+                    values[frame_idx] = f[1][name]
+            series[name] = values
+        filled, frames = interpolate_gaps(known, series, max_gap, method)
+        result = list(ball_positions)
+        for row, frame_idx in enumerate(frames.tolist()):
+            entry = {name: filled[name][row].tolist() for name in fields if not np.isnan(filled[name][row]).any()}
+            entry["interpolated"] = True
+            result[frame_idx] = {1: entry}
+        return result
+
+    def _interpolate_ball_table(self, table: TrackTable, max_gap: int, method: str) -> None:
+        rows = np.flatnonzero(table.category_mask('ball') & (table.track_id == 1))
+        known = np.zeros(table.n_frames, dtype=bool)
+        known[table.frame[rows]] = True
+        series = {}
+        for name in INTERPOLATED_FIELDS:
+            values = np.full((table.n_frames,) + getattr(table, name).shape[1:], np.nan)
+            values[table.frame[rows]] = getattr(table, name)[rows]
+            series[name] = values
+        filled, frames = interpolate_gaps(known, series, max_gap, method)
+        if len(frames) == 0:
+            return
+        columns = dict(filled)
+        columns.update({
+            "frame": frames,
+            "track_id": np.ones(len(frames)),
+            "category": np.full(len(frames), CATEGORIES.index('ball')),
+            "interpolated": np.ones(len(frames), dtype=bool),
+        })
+        table.insert_rows(columns)
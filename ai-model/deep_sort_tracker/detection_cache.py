@@ -0,0 +1,35 @@
+import numpy as np
+import sys
+from typing import List, Optional
+sys.path.append('../')
+from stage_cache import StageCache
+
+class DetectionCache:
+    # the detection stage of a StageCache, keyed by video and weights content; pass the pipeline's
+    # StageCache as stages so both share one in-memory map and one eviction pass
+
+    def __init__(self, cache_dir: str = "cache/stages", max_bytes: int = 2 << 30,
+                 stages: Optional[StageCache] = None) -> None:
+        self.stages = stages if stages is not None else StageCache(cache_dir, max_bytes=max_bytes)
+
+    def file_hash(self, path: str) -> str:
+        return self.stages.file_hash(path)
+
+    def make_key(self, video_path: str, model_path: str, **params) -> str:
+        return self.stages.make_key("detection", self.file_hash(video_path), self.file_hash(model_path), **params)
+
+    def get(self, key: str) -> Optional[List[Optional[np.ndarray]]]:
+        value = self.stages.get(key)
+        if value is None:
+            return None
+        detections = value["detections"]
+        if "keyframes" in value:
+            detections = [d if keyframe else None for d, keyframe in zip(detections, value["keyframes"])]
+        return detections
+
+    def put(self, key: str, detections: List[Optional[np.ndarray]]) -> None:
+        # frames skipped by the detection stride (None) are stored empty, with a keyframe mask
+        value = {"detections": [d if d is not None else np.zeros((0, 6), dtype=np.float32) for d in detections]}
+        if any(d is None for d in detections):
+            value["keyframes"] = np.array([d is not None for d in detections])
+        self.stages.put(key, value)
@@ -0,0 +1,52 @@
+import sys
+import numpy as np
+from typing import Dict
+from scipy.optimize import linear_sum_assignment
+sys.path.append('../')
+from track_table import TrackTable
+
+def box_iou(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    # (N, M) IoU between two sets of x1, y1, x2, y2 boxes
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    return inter / np.maximum(area_a[:, None] + area_b[None, :] - inter, 1e-9)
+
+def id_stability(tracks, reference, category: str = "players", iou_threshold: float = 0.5) -> Dict[str, float]:
+    # Compares the IDs of tracks against a reference run of the same video (e.g. detection stride k
+    # against stride 1). Boxes are matched per frame by IoU; an ID switch is a reference track whose
+    # matched ID differs from the one it was last matched to, as in the MOT IDSW count.
+    tracks = tracks if isinstance(tracks, TrackTable) else TrackTable.from_tracks(tracks)
+    reference = reference if isinstance(reference, TrackTable) else TrackTable.from_tracks(reference)
+    hyp_rows = tracks.category_mask(category)
+    ref_rows = reference.category_mask(category)
+    last_match: Dict[int, int] = {}
+    matched = switches = 0
+    for frame_idx in range(min(tracks.n_frames, reference.n_frames)):
+        ref = np.flatnonzero(ref_rows[reference.frame_slice(frame_idx)]) + reference.frame_offsets[frame_idx]
+        hyp = np.flatnonzero(hyp_rows[tracks.frame_slice(frame_idx)]) + tracks.frame_offsets[frame_idx]
+        if len(ref) == 0 or len(hyp) == 0:
+            continue
+        iou = box_iou(reference.bbox[ref], tracks.bbox[hyp])
+        for r, h in zip(*linear_sum_assignment(-iou)):
+            if iou[r, h] < iou_threshold:
+                continue
+            ref_id, hyp_id = int(reference.track_id[ref[r]]), int(tracks.track_id[hyp[h]])
+            if last_match.get(ref_id, hyp_id) != hyp_id:
+                switches += 1
+            last_match[ref_id] = hyp_id
+            matched += 1
+
+    n_reference = int(ref_rows.sum())
+    return {
+        "matched": matched,
+        "recall": matched / n_reference if n_reference else 0.0,
+        "id_switches": switches,
+        "switches_per_1000": 1000.0 * switches / matched if matched else 0.0,
+        "ids": len(np.unique(tracks.track_id[hyp_rows])),
+        "reference_ids": len(np.unique(reference.track_id[ref_rows])),
+    }
@@ -0,0 +1,83 @@
+import sys
+import argparse
+import numpy as np
+import cv2
+sys.path.append('../')
+from deep_sort_tracker import DeepSortTracker, id_stability
+
+# ID stability of strided detection on a synthetic fixture: players cross a panning pitch, and the
+# detections are their true boxes with a little jitter. Only tracking runs, so no detector is loaded.
+# The stride 1 run is the reference; every stride must stay under --max-switches ID switches per
+# 1000 matched boxes. --embedder color swaps DeepSort's MobileNet for mean crop colour, which needs
+# no torch.
+#
+#   python stride_id_stability.py --strides 2 3 5 --embedder color
+
+def make_fixture(n_frames=300, n_players=14, size=(720, 1280), pan=4.0, seed=0):
+    # frames, per-frame (N, 6) detections and per-frame camera motion rows (dx, dy)
+    rng = np.random.default_rng(seed)
+    height, width = size
+    start = rng.uniform([100, 150], [width - 100, height - 150], size=(n_players, 2))
+    velocity = rng.uniform(-3, 3, size=(n_players, 2))
+    colors = rng.integers(0, 255, size=(n_players, 3))
+    frames, detections, motion = [], [], []
+    for i in range(n_frames):
+        # the camera pans back and forth; players move in pitch coordinates
+        offset = pan * 60 * np.sin(i / 60)
+        dx = offset - (pan * 60 * np.sin((i - 1) / 60) if i else 0.0)
+        frame = np.full((height, width, 3), (40, 140, 40), dtype=np.uint8)
+        for x in range(-int(offset) % 160, width, 160):
+            cv2.line(frame, (x, 0), (x, height), (220, 220, 220), 2)
+        # players bounce off the margins instead of piling up against them
+        low, span = np.array([100, 150]), np.array([width - 200, height - 300])
+        centers = np.abs((start - low + velocity * i) % (2 * span) - span)
+        centers = low + span - centers - [offset, 0]
+        rows = []
+        for (cx, cy), color in zip(centers, colors):
+            x1, y1, x2, y2 = cx - 15, cy - 35, cx + 15, cy + 35
+            cv2.rectangle(frame, (int(x1), int(y1)), (int(x2), int(y2)), [int(c) for c in color], -1)
+            jitter = rng.normal(0, 1.0, size=4)
+            rows.append([x1 + jitter[0], y1 + jitter[1], x2 + jitter[2], y2 + jitter[3], 0.9, 2])
+        frames.append(frame)
+        detections.append(np.array(rows, dtype=np.float32))
+        motion.append([dx, 0.0])
+    return frames, detections, np.array(motion)
+
+class ColorEmbedder:
+    # mean BGR colour of each crop, unit length; the fixture's players differ by shirt colour only
+    def predict(self, crops):
+        features = []
+        for crop in crops:
+            mean = crop.reshape(-1, 3).mean(axis=0) + 1.0 if crop.size else np.ones(3)
+            features.append(mean / np.linalg.norm(mean))
+        return features
+
+def run(stride, frames, detections, motion, embedder):
+    tracker = DeepSortTracker(None, detection_stride=stride,
+                              embedder=ColorEmbedder() if embedder == "color" else "default")
+    keyframes = tracker.select_keyframes(len(frames), motion)
+    strided = [d if keyframe else None for d, keyframe in zip(detections, keyframes)]
+    return tracker.track_frames(frames, strided, motion)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--embedder", choices=["default", "color"], default="default")
+    parser.add_argument("--strides", type=int, nargs="+", default=[3])
+    parser.add_argument("--frames", type=int, default=300)
+    parser.add_argument("--max-switches", type=float, default=5.0, help="ID switches per 1000 matched boxes")
+    args = parser.parse_args()
+
+    frames, detections, motion = make_fixture(args.frames)
+    reference = run(1, frames, detections, motion, args.embedder)
+    failed = False
+    for stride in args.strides:
+        stats = id_stability(run(stride, frames, detections, motion, args.embedder), reference)
+        ok = stats["switches_per_1000"] <= args.max_switches
+        failed |= not ok
+        print(f"stride {stride}: {stats['id_switches']} switches ({stats['switches_per_1000']:.2f} per 1000), "
+              f"recall {stats['recall']:.3f}, {stats['ids']} ids vs {stats['reference_ids']} "
+              f"{'ok' if ok else 'FAIL'}")
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
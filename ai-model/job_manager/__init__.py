@@ -0,0 +1 @@
+from .job_manager import JobManager
\ No newline at end of file
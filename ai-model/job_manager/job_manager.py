@@ -0,0 +1,144 @@
+import time
+import uuid
+import asyncio
+import threading
+import traceback
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+class JobManager:
+
+    def __init__(self, max_workers: int = 2, max_finished_jobs: int = 20) -> None:
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="spar-job")
+        self.max_finished_jobs = max_finished_jobs
+        self.jobs: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.lock = threading.Lock()
+        # asyncio events of the live streams following each job, set on every live update and when
+        # the job finishes; publishers run in worker threads, so each is set on its own event loop
+        self.listeners: Dict[str, List[Tuple[asyncio.AbstractEventLoop, asyncio.Event]]] = {}
+
+    def create(self) -> str:
+        job_id = uuid.uuid4().hex
+        with self.lock:
+            self.jobs[job_id] = {
+                "id":         job_id,
+                "status":     "queued",
+                "stage":      None,
+                "progress":   {},
+                "error":      None,
+                "result":     None,
+                "created":    time.time(),
+                "finished":   None,
+                "live":         None,
+                "live_version": 0,
+            }
+        return job_id
+
+    def start(self, job_id: str, fn: Callable[..., Any], *args, **kwargs) -> None:
+        # fn gets a report(stage, fraction) callback for per-stage progress and a publish(payload)
+        # callback for live partial results
+        def report(stage: str, fraction: float = 1.0) -> None:
+            with self.lock:
+                job = self.jobs.get(job_id)
+                if job is None:
+                    return
+                job["stage"] = stage
+                job["progress"][stage] = round(min(max(float(fraction), 0.0), 1.0), 3)
+
+        def publish(payload: Any) -> None:
+            self.publish(job_id, payload)
+
+        def run() -> None:
+            with self.lock:
+                self.jobs[job_id]["status"] = "running"
+            try:
+                result = fn(*args, report=report, publish=publish, **kwargs)
+            except Exception as e:
+                traceback.print_exc()
+                self._finish(job_id, "failed", error=str(e))
+            else:
+                self._finish(job_id, "done", result=result)
+
+        self.executor.submit(run)
+
+    def submit(self, fn: Callable[..., Any], *args, **kwargs) -> str:
+        job_id = self.create()
+        self.start(job_id, fn, *args, **kwargs)
+        return job_id
+
+    def _finish(self, job_id: str, status: str, result: Any = None, error: Optional[str] = None) -> None:
+        with self.lock:
+            job = self.jobs[job_id]
+            job.update({"status": status, "result": result, "error": error, "finished": time.time()})
+            finished = [jid for jid, j in self.jobs.items() if j["finished"] is not None]
+            for jid in finished[:max(0, len(finished) - self.max_finished_jobs)]:
+                del self.jobs[jid]
+            self._notify(job_id)
+
+    def publish(self, job_id: str, payload: Any) -> None:
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return
+            job["live"] = payload
+            job["live_version"] += 1
+            self._notify(job_id)
+
+    def _notify(self, job_id: str) -> None:
+        # called under the lock
+        for loop, event in self.listeners.get(job_id, ()):
+            loop.call_soon_threadsafe(event.set)
+
+    def listen(self, job_id: str) -> asyncio.Event:
+        # an event of the running loop, set whenever the job changes; release it with unlisten()
+        event = asyncio.Event()
+        with self.lock:
+            self.listeners.setdefault(job_id, []).append((asyncio.get_running_loop(), event))
+        return event
+
+    def unlisten(self, job_id: str, event: asyncio.Event) -> None:
+        with self.lock:
+            listeners = [(loop, e) for loop, e in self.listeners.get(job_id, ()) if e is not event]
+            if listeners:
+                self.listeners[job_id] = listeners
+            else:
+                self.listeners.pop(job_id, None)
+
+    def live(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return None
+            return {k: job[k] for k in ("status", "error", "live", "live_version")}
+
+    def status(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return None
+            return {k: (dict(v) if k == "progress" else v) for k, v in job.items() if k not in ("result", "live")}
+
+    def outcome(self, job_id: str) -> Optional[Dict[str, Any]]:
+        # status and result read together, so a "done" job always comes with its result
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return None
+            return {k: job[k] for k in ("status", "error", "result")}
+
+    def result(self, job_id: str) -> Any:
+        with self.lock:
+            job = self.jobs.get(job_id)
+            return job["result"] if job is not None else None
+
+    def latest_finished(self) -> Optional[str]:
+        with self.lock:
+            done = [j for j in self.jobs.values() if j["status"] == "done"]
+            if not done:
+                return None
+            return max(done, key=lambda j: j["finished"])["id"]
+
+    def shutdown(self, wait: bool = False) -> None:
+        # queued jobs are cancelled; wait=True also blocks until the running ones finish
+        self.executor.shutdown(wait=wait, cancel_futures=True)
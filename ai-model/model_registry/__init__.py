@@ -0,0 +1 @@
+from .model_registry import ModelRegistry
\ No newline at end of file
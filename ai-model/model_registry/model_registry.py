@@ -0,0 +1,54 @@
+import sys
+import threading
+from typing import Optional
+sys.path.append('../')
+from deep_sort_tracker import DeepSortTracker
+from Re_ID.reid_model import ReIDModel
+
+class ModelRegistry:
+    # Loads the detector and the Re-ID model once per process. Jobs get their own tracker
+    # (DeepSort state) through tracker(); the weights and the Re-ID model are shared.
+
+    def __init__(self, model_path: str = "models/best.pt", device: Optional[str] = "auto", imgsz: int = 640,
+                 cpu_threads: Optional[int] = None, cpu_backend: Optional[str] = "openvino",
+                 detection_stride: int = 1, adaptive_stride: bool = True) -> None:
+        self.detector_config = dict(model_path=model_path, device=device, imgsz=imgsz,
+                                    cpu_threads=cpu_threads, cpu_backend=cpu_backend,
+                                    detection_stride=detection_stride, adaptive_stride=adaptive_stride)
+        self.detector: Optional[DeepSortTracker] = None
+        self.reid: Optional[ReIDModel] = None
+        self.lock = threading.Lock()
+        self.closed = False
+
+    def load(self, warmup: bool = True) -> "ModelRegistry":
+        # idempotent; called from the server's startup hook, and lazily if a job runs before it.
+        # After close() it refuses, so a job still running at shutdown cannot bring the weights back.
+        with self.lock:
+            if self.closed:
+                raise RuntimeError("model registry is closed")
+            if self.detector is None:
+                detector = DeepSortTracker(**self.detector_config)
+                if warmup:
+                    detector.warmup()
+                self.detector = detector
+            if self.reid is None:
+                reid = ReIDModel(device=self.detector.device)
+                if warmup:
+                    reid.warmup()
+                self.reid = reid
+        return self
+
+    def tracker(self) -> DeepSortTracker:
+        return self.load().detector.fork()
+
+    def reid_model(self) -> ReIDModel:
+        return self.load().reid
+
+    def close(self) -> None:
+        with self.lock:
+            device = self.detector.device if self.detector is not None else "cpu"
+            self.detector, self.reid = None, None
+            self.closed = True
+        if device.startswith("cuda"):
+            import torch
+            torch.cuda.empty_cache()
@@ -1 +1,2 @@
 from .performance_evaluator import PerformanceEvaluator, estimate_player_value_advanced
+from .event_engine import MatchEventEngine
\ No newline at end of file
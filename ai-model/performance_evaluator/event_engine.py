@@ -0,0 +1,199 @@
+import sys
+import numpy as np
+from typing import Dict, List, Any, Optional
+sys.path.append('../')
+from track_table import TrackTable
+
+def empty_player_stats() -> Dict[str, float]:
+    return {
+        "distance": 0.0,
+        "avg_speed": 0.0,
+        "passes": 0,
+        "goals": 0,
+        "assists": 0,
+        "possession_frames": 0,
+        "total_frames": 0,
+        "interceptions": 0,
+        "shots": 0,
+        "speed_sum": 0.0,
+        "speed_count": 0,
+    }
+
+class MatchEventEngine:
+    # Walks the match once, frame by frame, and keeps running per-player aggregates.
+    # Frames can be fed in chunks (update) while the video is still being processed.
+    # Events: possession_change, pass, interception, shot, goal.
+
+    def __init__(self, frame_rate: float = 24.0, goal_x_threshold: float = 50,
+                 assist_window: int = 30, shot_speed_kmh: float = 45.0) -> None:
+        self.frame_rate = float(frame_rate) if frame_rate and frame_rate > 0 else 24.0
+        self.goal_x_threshold = goal_x_threshold
+        self.assist_window = assist_window
+        self.shot_speed_kmh = shot_speed_kmh
+
+        self.stats: Dict[int, Dict[str, float]] = {}
+        self.events: List[Dict[str, Any]] = []
+        self.teams: Dict[int, int] = {}
+        self.last_distance: Dict[int, float] = {}
+        self.frame_idx = 0
+        self.previous_holder = -1
+        self.last_possessor = -1
+        self.second_last_possessor = -1
+        self.frames_since_pass = 9999
+        self.shot_taken = False
+        self.last_ball_point = None
+        self.last_ball_frame = -1
+
+    def _player(self, pid: int) -> Dict[str, float]:
+        if pid not in self.stats:
+            self.stats[pid] = empty_player_stats()
+        return self.stats[pid]
+
+    def _emit(self, kind: str, player: int, **details) -> None:
+        event = {"type": kind, "frame": self.frame_idx, "player": player, **details}
+        self.events.append(event)
+
+    def _distance_increments(self, pid: int, distance: np.ndarray) -> float:
+        # Track distances are cumulative. A drop means the values restarted (speed estimated per chunk),
+        # so the new value counts in full; for one whole-video pass this equals the track's final distance.
+        if len(distance) == 0:
+            return 0.0
+        previous = np.concatenate([[self.last_distance.get(pid, 0.0)], distance[:-1]])
+        self.last_distance[pid] = float(distance[-1])
+        return float(np.where(distance >= previous, distance - previous, distance).sum())
+
+    def update(self, tracks) -> int:
+        # feeds the next chunk of frames; returns the number of events it produced
+        n_events = len(self.events)
+        if isinstance(tracks, TrackTable):
+            self._update_table(tracks)
+        else:
+            for players, ball in zip(tracks["players"], tracks["ball"]):
+                self.update_frame(players, ball.get(1))
+        return len(self.events) - n_events
+
+    def update_frame(self, players: Dict[int, Dict[str, Any]], ball: Optional[Dict[str, Any]]) -> None:
+        possessor = -1
+        for pid, info in players.items():
+            stats = self._player(pid)
+            stats["total_frames"] += 1
+            if info.get("has_ball", False):
+                stats["possession_frames"] += 1
+                if possessor == -1:
+                    possessor = pid
+            if "distance" in info:
+                stats["distance"] += self._distance_increments(pid, np.array([info["distance"]]))
+            if "speed" in info:
+                stats["speed_sum"] += info["speed"]
+                stats["speed_count"] += 1
+            if info.get("team"):
+                self.teams[pid] = info["team"]
+
+        x_center, ball_point = None, None
+        if ball is not None and not ball.get("interpolated", False):
+            x_center = (ball["bbox"][0] + ball["bbox"][2]) / 2.0
+            if ball.get("position_transformed") is not None:
+                ball_point = ball["position_transformed"]
+        self._ball_events(possessor, x_center, ball_point)
+
+    def _update_table(self, table: TrackTable) -> None:
+        # per-player aggregates are column reductions; only the ball/possession sequence is walked
+        players = table.category_mask('players')
+        for pid, rows in table.track_rows(players).items():
+            stats = self._player(pid)
+            stats["total_frames"] += len(rows)
+            stats["possession_frames"] += int(table.has_ball[rows].sum())
+            distance = table.distance[rows]
+            stats["distance"] += self._distance_increments(pid, distance[~np.isnan(distance)])
+            speed = table.speed[rows]
+            speed = speed[~np.isnan(speed)]
+            stats["speed_sum"] += float(speed.sum())
+            stats["speed_count"] += len(speed)
+            teams = table.team[rows]
+            if teams[-1]:
+                self.teams[pid] = int(teams[-1])
+
+        possessors = np.full(table.n_frames, -1, dtype=np.int64)
+        rows = np.flatnonzero(table.has_ball & players)
+        frames, first = np.unique(table.frame[rows], return_index=True)
+        possessors[frames] = table.track_id[rows[first]]
+
+        x_centers = [None] * table.n_frames
+        ball_points = [None] * table.n_frames
+        rows = np.flatnonzero(table.category_mask('ball') & (table.track_id == 1) & ~table.interpolated)
+        x = ((table.bbox[rows, 0] + table.bbox[rows, 2]) / 2.0).tolist()
+        points = table.position_transformed[rows]
+        has_point = ~np.isnan(points).any(axis=1)
+        for frame_idx, x_center, point, valid in zip(table.frame[rows].tolist(), x, points.tolist(),
+                                                     has_point.tolist()):
+            x_centers[frame_idx] = x_center
+            ball_points[frame_idx] = point if valid else None
+
+        for possessor, x_center, ball_point in zip(possessors.tolist(), x_centers, ball_points):
+            self._ball_events(possessor, x_center, ball_point)
+
+    def _ball_events(self, possessor: int, x_center: Optional[float], ball_point: Optional[list]) -> None:
+        if possessor != -1 and possessor != self.previous_holder and self.previous_holder != -1:
+            # passes follow the holder sequence across goals, as detect_passes always did
+            previous = self.previous_holder
+            self._emit("possession_change", possessor, previous=previous)
+            own, other = self.teams.get(previous, 0), self.teams.get(possessor, 0)
+            if own and other and own != other:
+                self._player(possessor)["interceptions"] += 1
+                self._emit("interception", possessor, previous=previous)
+            else:
+                # without team information every change of possessor counts as a pass
+                self._player(previous)["passes"] += 1
+                self._emit("pass", previous, receiver=possessor)
+        if possessor != -1:
+            self.previous_holder = possessor
+
+        if possessor != -1 and possessor != self.last_possessor:
+            previous = self.last_possessor
+            self.second_last_possessor = previous
+            self.last_possessor = possessor
+            self.frames_since_pass = 0
+            self.shot_taken = False
+        else:
+            self.frames_since_pass += 1
+
+        # a fast ball nobody holds, right after a possession, is a shot by the last possessor
+        if ball_point is not None:
+            if self.last_ball_point is not None and possessor == -1 and self.last_possessor != -1 \
+                    and not self.shot_taken:
+                dt = (self.frame_idx - self.last_ball_frame) / self.frame_rate
+                step = np.hypot(ball_point[0] - self.last_ball_point[0], ball_point[1] - self.last_ball_point[1])
+                if dt > 0 and step / dt * 3.6 > self.shot_speed_kmh:
+                    self._shot()
+            self.last_ball_point, self.last_ball_frame = ball_point, self.frame_idx
+
+        if x_center is not None and self.last_possessor != -1 and x_center < self.goal_x_threshold:
+            scorer = self.last_possessor
+            if not self.shot_taken:
+                self._shot()
+            self._player(scorer)["goals"] += 1
+            assist = -1
+            if self.second_last_possessor != -1 and self.frames_since_pass < self.assist_window:
+                assist = self.second_last_possessor
+                self._player(assist)["assists"] += 1
+            self._emit("goal", scorer, assist=assist)
+            self.last_possessor = -1
+            self.second_last_possessor = -1
+            self.frames_since_pass = 9999
+
+        self.frame_idx += 1
+
+    def _shot(self) -> None:
+        self.shot_taken = True
+        self._player(self.last_possessor)["shots"] += 1
+        self._emit("shot", self.last_possessor)
+
+    def player_stats(self) -> Dict[int, Dict[str, float]]:
+        # snapshot in the compute_player_stats format
+        result = {}
+        for pid, stats in self.stats.items():
+            snapshot = {name: value for name, value in stats.items() if name not in ("speed_sum", "speed_count")}
+            if stats["speed_count"]:
+                snapshot["avg_speed"] = stats["speed_sum"] / stats["speed_count"]
+            result[pid] = snapshot
+        return result
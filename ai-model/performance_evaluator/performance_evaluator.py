@@ -1,133 +1,69 @@
-import numpy as np
-from typing import Dict, List, Any
-from collections import defaultdict, Counter
+from typing import Dict, List, Any, Optional
+from .event_engine import MatchEventEngine
 
 class PerformanceEvaluator:
     
-    def __init__(self):
+    def __init__(self, frame_rate: float = 24.0):
         # Thresholds for goal detection (if needed)
         self.goal_x_threshold = 50
         self.goal_y_threshold = 10
+        self.frame_rate = frame_rate
+        # running engine for live updates (update / current_ratings)
+        self.engine: Optional[MatchEventEngine] = None
 
-    def compute_player_stats(self, tracks: Dict[str, List[Dict[Any, Any]]]) -> Dict[int, Dict[str, float]]:
-
-        player_stats = {}
-        speed_sums = defaultdict(float)
-        speed_counts = defaultdict(int)
-
-        for frame_data in tracks["players"]:
-            for player_id, info in frame_data.items():
-                if player_id not in player_stats:
-                    player_stats[player_id] = {
-                        "distance": 0.0,
-                        "avg_speed": 0.0,
-                        "passes": 0,
-                        "goals": 0,
-                        "assists": 0,
-                        "possession_frames": 0,
-                        "total_frames": 0,
-                    }
-                player_stats[player_id]["total_frames"] += 1
-                if info.get("has_ball", False):
-                    player_stats[player_id]["possession_frames"] += 1
-                if "distance" in info:
-                    current_dist = info["distance"]
-                    if current_dist > player_stats[player_id]["distance"]:
-                        player_stats[player_id]["distance"] = current_dist
-                if "speed" in info:
-                    speed_sums[player_id] += info["speed"]
-                    speed_counts[player_id] += 1
-
-        
-        pass_counts = self.detect_passes(tracks)
-        for pid, p_count in pass_counts.items():
-            if pid in player_stats:
-                player_stats[pid]["passes"] = p_count
+    def new_engine(self) -> MatchEventEngine:
+        return MatchEventEngine(frame_rate=self.frame_rate, goal_x_threshold=self.goal_x_threshold)
 
-        
-        ga_counts = self.detect_goals_and_assists(tracks)
-        for pid, ga_dict in ga_counts.items():
-            if pid not in player_stats:
-                player_stats[pid] = {
-                    "distance": 0.0,
-                    "avg_speed": 0.0,
-                    "passes": 0,
-                    "goals": 0,
-                    "assists": 0,
-                    "possession_frames": 0,
-                    "total_frames": 0,
-                }
-            if "goals" in ga_dict:
-                player_stats[pid]["goals"] += ga_dict["goals"]
-            if "assists" in ga_dict:
-                player_stats[pid]["assists"] += ga_dict["assists"]
+    def run_engine(self, tracks: Dict[str, List[Dict[Any, Any]]]) -> MatchEventEngine:
+        engine = self.new_engine()
+        engine.update(tracks)
+        return engine
 
-        
-        for pid in speed_sums:
-            if speed_counts[pid] > 0:
-                player_stats[pid]["avg_speed"] = speed_sums[pid] / speed_counts[pid]
+    def update(self, tracks: Dict[str, List[Dict[Any, Any]]]) -> int:
+        # feeds the next chunk of frames into the running engine; returns the number of new events
+        if self.engine is None:
+            self.engine = self.new_engine()
+        return self.engine.update(tracks)
 
-        return player_stats
+    def current_ratings(self) -> Dict[int, Dict[str, float]]:
+        if self.engine is None:
+            return {}
+        return self.ratings_from_stats(self.engine.player_stats())
 
-    def detect_passes(self, tracks: Dict[str, List[Dict[Any, Any]]]) -> Dict[int, int]:
-        
-        pass_counts = {}
-        last_possessor = -1
-        for frame_idx, player_dict in enumerate(tracks["players"]):
-            current_possessor = -1
-            for pid, info in player_dict.items():
-                if info.get("has_ball", False):
-                    current_possessor = pid
-                    break
-            if current_possessor != -1 and last_possessor != -1 and current_possessor != last_possessor:
-                pass_counts[last_possessor] = pass_counts.get(last_possessor, 0) + 1
-            if current_possessor != -1:
-                last_possessor = current_possessor
-        return pass_counts
-
-    def detect_goals_and_assists(self, tracks: Dict[str, List[Dict[Any, Any]]]) -> Dict[int, Dict[str, int]]:
-        
-        ga_counts = {}
-        last_possessor = -1
-        second_last_possessor = -1
-        frames_since_pass = 9999
-
-        for frame_idx, player_dict in enumerate(tracks["players"]):
-            current_possessor = -1
-            for pid, info in player_dict.items():
-                if info.get("has_ball", False):
-                    current_possessor = pid
-                    break
-            if current_possessor != -1 and last_possessor != -1 and current_possessor != last_possessor:
-                second_last_possessor = last_possessor
-                last_possessor = current_possessor
-                frames_since_pass = 0
-            elif current_possessor != -1 and last_possessor == -1:
-                last_possessor = current_possessor
-                second_last_possessor = -1
-                frames_since_pass = 0
-            else:
-                frames_since_pass += 1
-
-            if 1 in tracks["ball"][frame_idx]:
-                ball_bbox = tracks["ball"][frame_idx][1]["bbox"]
-                x_center = (ball_bbox[0] + ball_bbox[2]) / 2.0
-                if last_possessor != -1 and x_center < self.goal_x_threshold:
-                    if last_possessor not in ga_counts:
-                        ga_counts[last_possessor] = {"goals": 0, "assists": 0}
-                    ga_counts[last_possessor]["goals"] += 1
-                    if second_last_possessor != -1 and frames_since_pass < 30:
-                        if second_last_possessor not in ga_counts:
-                            ga_counts[second_last_possessor] = {"goals": 0, "assists": 0}
-                        ga_counts[second_last_possessor]["assists"] += 1
-                    last_possessor = -1
-                    second_last_possessor = -1
-                    frames_since_pass = 9999
-        return ga_counts
+    def compute_player_stats(self, tracks: Dict[str, List[Dict[Any, Any]]]) -> Dict[int, Dict[str, float]]:
+        # one pass over the match: aggregates, passes, goals and assists come from the event engine
+        return self.run_engine(tracks).player_stats()
+
+    def match_events(self, tracks: Dict[str, List[Dict[Any, Any]]]) -> List[Dict[str, Any]]:
+        return self.run_engine(tracks).events
+
+    def detect_passes(self, tracks: Optional[Dict[str, List[Dict[Any, Any]]]] = None,
+                      events: Optional[List[Dict[str, Any]]] = None) -> Dict[int, int]:
+        # pass the list from match_events to share one engine run with detect_goals_and_assists
+        events = self.match_events(tracks) if events is None else events
+        passes: Dict[int, int] = {}
+        for event in events:
+            if event["type"] == "pass":
+                passes[event["player"]] = passes.get(event["player"], 0) + 1
+        return passes
+
+    def detect_goals_and_assists(self, tracks: Optional[Dict[str, List[Dict[Any, Any]]]] = None,
+                                 events: Optional[List[Dict[str, Any]]] = None) -> Dict[int, Dict[str, int]]:
+        events = self.match_events(tracks) if events is None else events
+        result: Dict[int, Dict[str, int]] = {}
+        for event in events:
+            if event["type"] != "goal":
+                continue
+            result.setdefault(event["player"], {"goals": 0, "assists": 0})["goals"] += 1
+            if event["assist"] != -1:
+                result.setdefault(event["assist"], {"goals": 0, "assists": 0})["assists"] += 1
+        return result
 
     def evaluate_players_fifa_style(self, tracks: Dict[str, List[Dict[Any, Any]]]) -> Dict[int, Dict[str, float]]:
+        return self.ratings_from_stats(self.compute_player_stats(tracks))
+
+    def ratings_from_stats(self, player_stats: Dict[int, Dict[str, float]]) -> Dict[int, Dict[str, float]]:
         
-        player_stats = self.compute_player_stats(tracks)
         for pid, stats in player_stats.items():
             if stats["total_frames"] > 0:
                 stats["ball_control"] = stats["possession_frames"] / stats["total_frames"]
@@ -198,4 +134,3 @@ def estimate_player_value_advanced(rating_dict: Dict[str, float]) -> float:
     attribute_sum = pace_val + shoot_val + pass_val + drib_val + def_val + phy_val
     value_in_sar = base_value + (attribute_sum * scale_factor)
     return round(value_in_sar)
-
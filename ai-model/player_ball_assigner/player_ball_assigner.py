@@ -1,10 +1,20 @@
 import sys
+import numpy as np
 sys.path.append('../')
 from utils.bbox_utils import get_center_of_bbox, measure_distance
+from track_table import TrackTable
 
 class PlayerBallAssigner:
-    def __init__(self) -> None:
+    def __init__(self, max_field_distance: float = 2.0, release_factor: float = 1.5,
+                 switch_frames: int = 3) -> None:
+        # pixel threshold, used when a ball or player has no field position
         self.max_player_ball_distance = 70
+        # metres between a player's feet and the ball on the pitch
+        self.max_field_distance = max_field_distance
+        # hysteresis: the holder keeps the ball until it is release_factor * threshold away,
+        # and a challenger needs switch_frames consecutive nearest frames to take it over
+        self.release_factor = release_factor
+        self.switch_frames = switch_frames
 
     def assign_ball_to_player(self, players: dict, ball_bbox: list) -> int:
         ball_position = get_center_of_bbox(ball_bbox)
@@ -19,3 +29,79 @@ class PlayerBallAssigner:
                 min_dist = dist
                 assigned_player = player_id
         return assigned_player
+
+    def player_ball_scores(self, table: TrackTable) -> tuple:
+        # (player rows, score) where score = distance / threshold, so < 1 means "close enough"
+        ball_rows = np.flatnonzero(table.category_mask('ball'))
+        player_rows = np.flatnonzero(table.category_mask('players'))
+        ball_field = np.full((table.n_frames, 2), np.nan)
+        ball_pixel = np.full((table.n_frames, 2), np.nan)
+        # one ball per frame; the first row wins if the tracker produced several
+        frames, first = np.unique(table.frame[ball_rows], return_index=True)
+        ball_rows = ball_rows[first]
+        ball_field[frames] = table.position_transformed[ball_rows]
+        x1, y1, x2, y2 = table.bbox[ball_rows].T
+        ball_pixel[frames] = np.stack([np.trunc((x1 + x2) / 2), np.trunc((y1 + y2) / 2)], axis=1)
+
+        player_frames = table.frame[player_rows]
+        field_distance = np.linalg.norm(table.position_transformed[player_rows] - ball_field[player_frames], axis=1)
+        bbox = table.bbox[player_rows]
+        ball = ball_pixel[player_frames]
+        pixel_distance = np.minimum(
+            np.hypot(bbox[:, 0] - ball[:, 0], bbox[:, 3] - ball[:, 1]),
+            np.hypot(bbox[:, 2] - ball[:, 0], bbox[:, 3] - ball[:, 1]),
+        )
+        score = np.where(
+            np.isnan(field_distance),
+            pixel_distance / self.max_player_ball_distance,
+            field_distance / self.max_field_distance,
+        )
+        keep = ~np.isnan(score)
+        return player_rows[keep], score[keep]
+
+    def assign_possession(self, tracks) -> np.ndarray:
+        # possessor track ID per frame (-1 if nobody) for the whole video; sets has_ball on the players
+        if not isinstance(tracks, TrackTable):
+            table = TrackTable.from_tracks(tracks)
+            possessor = self.assign_possession(table)
+            for frame_idx, pid in enumerate(possessor.tolist()):
+                if pid != -1:
+                    tracks['players'][frame_idx][pid]['has_ball'] = True
+            return possessor
+
+        possessor = np.full(tracks.n_frames, -1, dtype=np.int64)
+        rows, score = self.player_ball_scores(tracks)
+        if len(rows) == 0:
+            return possessor
+        frames = tracks.frame[rows]
+
+        # nearest player per frame: sort by (frame, score) and take each frame's first row
+        order = np.lexsort((score, frames))
+        best_frames, first = np.unique(frames[order], return_index=True)
+        nearest = np.full(tracks.n_frames, -1, dtype=np.int64)
+        nearest_score = np.full(tracks.n_frames, np.inf)
+        nearest[best_frames] = tracks.track_id[rows[order[first]]]
+        nearest_score[best_frames] = score[order[first]]
+        # holder lookups only ever need rows inside the release radius
+        close = score < self.release_factor
+        within_release = set(zip(frames[close].tolist(), tracks.track_id[rows[close]].tolist()))
+
+        holder, challenger, streak = -1, -1, 0
+        for frame_idx in range(tracks.n_frames):
+            candidate = int(nearest[frame_idx]) if nearest_score[frame_idx] < 1.0 else -1
+            if holder != -1 and (frame_idx, holder) not in within_release:
+                holder = -1
+            if candidate == -1 or candidate == holder:
+                challenger, streak = -1, 0
+            elif holder == -1:
+                holder, challenger, streak = candidate, -1, 0
+            else:
+                streak = streak + 1 if candidate == challenger else 1
+                challenger = candidate
+                if streak >= self.switch_frames:
+                    holder, challenger, streak = candidate, -1, 0
+            possessor[frame_idx] = holder
+
+        held = possessor[tracks.frame[rows]] == tracks.track_id[rows]
+        tracks.has_ball[rows[held]] = True
+        return possessor
@@ -0,0 +1,2 @@
+from .render_cache import RenderCache, RenderBusy
+from .annotators import track_annotator
\ No newline at end of file
@@ -0,0 +1,70 @@
+import numpy as np
+import cv2
+from typing import Callable, Dict
+import sys
+sys.path.append('../')
+from track_table import TrackTable
+
+REFEREE_COLOR   = (0, 255, 255)
+UNASSIGNED_COLOR = (200, 200, 200)
+BALL_COLOR      = (0, 255, 0)
+HOLDER_COLOR    = (0, 0, 255)
+
+def track_annotator(tracks: TrackTable, team_cols: Dict[int, tuple]) -> Callable[[int, np.ndarray], np.ndarray]:
+    # Final tracks only: Re-ID merged IDs on a team-colored ellipse, speed and distance under the
+    # feet, a triangle on the ball and on the ball holder. Per-frame geometry, colors and labels
+    # come from the frame's row slice in one go; only the cv2 primitives are per object.
+    palette = np.array([UNASSIGNED_COLOR, team_cols.get(1, UNASSIGNED_COLOR),
+                        team_cols.get(2, UNASSIGNED_COLOR)], dtype=np.int64)
+    players_code = tracks.category_mask('players')
+    referee_code = tracks.category_mask('referees')
+    ball_code = tracks.category_mask('ball')
+
+    def triangle(frame: np.ndarray, x: int, y: int, color: tuple) -> None:
+        points = np.array([[x, y], [x - 10, y - 20], [x + 10, y - 20]], dtype=np.int32)
+        cv2.drawContours(frame, [points], 0, color, cv2.FILLED)
+        cv2.drawContours(frame, [points], 0, (0, 0, 0), 2)
+
+    def annotate(idx: int, frame: np.ndarray) -> np.ndarray:
+        if idx >= tracks.n_frames:
+            return frame
+        rows = tracks.frame_slice(idx)
+        bbox = tracks.bbox[rows]
+        if not len(bbox):
+            return frame
+        frame = frame.copy()
+        x_center = ((bbox[:, 0] + bbox[:, 2]) / 2).astype(np.int32)
+        y_bottom = bbox[:, 3].astype(np.int32)
+        half_w = np.maximum(((bbox[:, 2] - bbox[:, 0]) / 2).astype(np.int32), 1)
+        is_player = players_code[rows]
+        is_referee = referee_code[rows]
+        colors = palette[np.clip(tracks.team[rows], 0, 2)]
+        colors[is_referee] = REFEREE_COLOR
+        speed = tracks.speed[rows]
+        distance = tracks.distance[rows]
+        track_ids = tracks.track_id[rows]
+        has_ball = tracks.has_ball[rows]
+
+        for i in np.flatnonzero(is_player | is_referee):
+            x, y, color = int(x_center[i]), int(y_bottom[i]), tuple(int(c) for c in colors[i])
+            cv2.ellipse(frame, (x, y), (int(half_w[i]), max(int(0.35 * half_w[i]), 1)), 0.0, -45, 235,
+                        color, 2, cv2.LINE_4)
+            if not is_player[i]:
+                continue
+            label = str(int(track_ids[i]))
+            cv2.rectangle(frame, (x - 16, y + 5), (x + 16, y + 23), color, cv2.FILLED)
+            cv2.putText(frame, label, (x - 6 * len(label) // 2 - 2, y + 19),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 0), 2)
+            if not np.isnan(speed[i]):
+                cv2.putText(frame, f"{speed[i]:.2f} km/h", (x - 30, y + 40),
+                            cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 0), 2)
+                cv2.putText(frame, f"{distance[i]:.2f} m", (x - 30, y + 60),
+                            cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 0), 2)
+            if has_ball[i]:
+                triangle(frame, x, int(bbox[i, 1]), HOLDER_COLOR)
+
+        for i in np.flatnonzero(ball_code[rows]):
+            triangle(frame, int(x_center[i]), int(bbox[i, 1]), BALL_COLOR)
+        return frame
+
+    return annotate
@@ -0,0 +1,142 @@
+import os
+import threading
+import traceback
+import numpy as np
+import cv2
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+class _Producer:
+    # one background render; readers follow it through the offsets list
+
+    def __init__(self) -> None:
+        self.offsets: List[int] = [0]       # byte offset where each frame starts, plus the end
+        self.done = False
+        self.error: Optional[str] = None
+        self.cond = threading.Condition()
+
+class RenderBusy(RuntimeError):
+    # every render slot is taken; the segment can be requested again once one finishes
+    pass
+
+class RenderCache:
+    # Annotated frames are rendered once per (key, width, quality) and stored as one segment of
+    # back-to-back JPEGs (<name>.mjpg) with a frame index of byte offsets (<name>.idx.npy). While a
+    # segment is being rendered, every client reads from the single producer's partial file.
+    # At most max_producers segments render at once, and finished segments are evicted least
+    # recently used first once they exceed max_bytes.
+
+    def __init__(self, root: str = "cache/render", max_bytes: int = 2 << 30, max_producers: int = 2) -> None:
+        self.root = root
+        self.max_bytes = max_bytes
+        self.max_producers = max_producers
+        self.producers: Dict[str, _Producer] = {}
+        self.lock = threading.Lock()
+
+    def _paths(self, name: str) -> tuple:
+        base = os.path.join(self.root, name)
+        return f"{base}.mjpg", f"{base}.idx.npy", f"{base}.mjpg.part"
+
+    def _render(self, name: str, producer: _Producer, frames: Iterable[np.ndarray],
+                annotate: Callable[[int, np.ndarray], np.ndarray], width: int, quality: int) -> None:
+        data_path, index_path, part_path = self._paths(name)
+        try:
+            with open(part_path, "ab") as f:
+                for idx, frame in enumerate(frames):
+                    annotated = annotate(idx, frame)
+                    h, w = annotated.shape[:2]
+                    if w != width:
+                        annotated = cv2.resize(annotated, (width, max(1, round(h * width / w))),
+                                               interpolation=cv2.INTER_AREA)
+                    _, jpg = cv2.imencode('.jpg', annotated, [cv2.IMWRITE_JPEG_QUALITY, quality])
+                    f.write(jpg.tobytes())
+                    f.flush()
+                    with producer.cond:
+                        producer.offsets.append(producer.offsets[-1] + len(jpg))
+                        producer.cond.notify_all()
+            # the index goes first: a finished segment is one whose .mjpg exists. Publishing happens
+            # under the cache lock, so a registered producer always has its part file in place.
+            with self.lock:
+                np.save(index_path, np.array(producer.offsets, dtype=np.int64))
+                os.replace(part_path, data_path)
+                self.producers.pop(name, None)
+                self._evict(keep=data_path)
+        except Exception as e:
+            traceback.print_exc()
+            producer.error = str(e)
+            with self.lock:
+                self.producers.pop(name, None)
+        finally:
+            with producer.cond:
+                producer.done = True
+                producer.cond.notify_all()
+
+    def _evict(self, keep: str) -> None:
+        # called under the cache lock with the segment just published, which is never evicted;
+        # readers hold open handles, so removing a segment never cuts a stream
+        entries = []
+        for name in os.listdir(self.root):
+            if not name.endswith(".mjpg"):
+                continue
+            data_path, index_path, _ = self._paths(name[:-len(".mjpg")])
+            if data_path == keep:
+                continue
+            try:
+                entries.append((os.path.getmtime(data_path), os.path.getsize(data_path), data_path, index_path))
+            except OSError:
+                continue
+        total = sum(size for _, size, _, _ in entries) + os.path.getsize(keep)
+        for _, size, data_path, index_path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            for path in (data_path, index_path):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            total -= size
+
+    def frames(self, name: str, frames_factory: Callable[[], Iterable[np.ndarray]],
+               annotate: Callable[[int, np.ndarray], np.ndarray], width: int, quality: int,
+               start: int = 0) -> Iterator[bytes]:
+        # JPEG bytes from frame `start` on, rendering the segment first if nobody has yet. Raises
+        # RenderBusy right away, before any frame is read, when a new render would exceed max_producers.
+        name = f"{name}_{width}w_q{quality}"
+        data_path, index_path, part_path = self._paths(name)
+        with self.lock:
+            producer = self.producers.get(name)
+            if producer is None and not os.path.exists(data_path):
+                if len(self.producers) >= self.max_producers:
+                    raise RenderBusy(f"{len(self.producers)} renders already running")
+                os.makedirs(self.root, exist_ok=True)
+                open(part_path, "wb").close()
+                producer = _Producer()
+                self.producers[name] = producer
+                threading.Thread(target=self._render, daemon=True, name=f"render-{name}",
+                                 args=(name, producer, frames_factory(), annotate, width, quality)).start()
+            # opened under the lock, so the handles survive the producer renaming or eviction removing the files
+            if producer is None:
+                offsets = np.load(index_path)
+                os.utime(data_path)     # recency for eviction
+                return self._replay(open(data_path, "rb"), offsets, start)
+            return self._follow(open(part_path, "rb"), producer, start)
+
+    @staticmethod
+    def _replay(handle, offsets: np.ndarray, start: int) -> Iterator[bytes]:
+        with handle as f:
+            f.seek(int(offsets[min(start, len(offsets) - 1)]))
+            for begin, end in zip(offsets[start:-1], offsets[start + 1:]):
+                yield f.read(int(end - begin))
+
+    @staticmethod
+    def _follow(handle, producer: _Producer, start: int) -> Iterator[bytes]:
+        idx = start
+        with handle as f:
+            while True:
+                with producer.cond:
+                    producer.cond.wait_for(lambda: producer.done or len(producer.offsets) > idx + 1)
+                    if len(producer.offsets) <= idx + 1:
+                        return
+                    begin, end = producer.offsets[idx], producer.offsets[idx + 1]
+                f.seek(begin)
+                yield f.read(end - begin)
+                idx += 1
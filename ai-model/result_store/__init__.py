@@ -0,0 +1 @@
+from .result_store import ResultStore, SCHEMA_VERSION
\ No newline at end of file
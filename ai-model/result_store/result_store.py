@@ -0,0 +1,130 @@
+import os
+import json
+import time
+import shutil
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+import sys
+sys.path.append('../')
+from track_table import TrackTable
+
+# bump when the on-disk layout or the meaning of a stored field changes
+SCHEMA_VERSION = 2
+
+class ResultStore:
+    # One directory per job:
+    #   meta.json       schema version, model hash, video path, fps, class names, team colors
+    #   stats.json      player ratings keyed by track ID
+    #   tracks.npz      TrackTable columns
+    #   video.<ext>     the uploaded video, moved in from the upload directory
+    # Loaded results are kept in a small in-memory LRU; beyond max_jobs the oldest jobs are deleted.
+
+    def __init__(self, root: str = "results", max_cached: int = 4, max_jobs: int = 50) -> None:
+        self.root = root
+        self.max_cached = max_cached
+        self.max_jobs = max_jobs
+        self.memory: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.lock = threading.Lock()
+
+    def _dir(self, job_id: str) -> str:
+        return os.path.join(self.root, os.path.basename(job_id))
+
+    def _remember(self, job_id: str, result: Dict[str, Any]) -> None:
+        with self.lock:
+            self.memory[job_id] = result
+            self.memory.move_to_end(job_id)
+            while len(self.memory) > self.max_cached:
+                self.memory.popitem(last=False)
+
+    def save(self, job_id: str, result: Dict[str, Any], model_hash: str = "") -> None:
+        tracks = result["tracks"]
+        table = tracks if isinstance(tracks, TrackTable) else TrackTable.from_tracks(tracks)
+
+        # written to a temporary directory and renamed, so readers never see half a result
+        final = self._dir(job_id)
+        tmp = f"{final}.tmp"
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        # the store owns the video from now on, so it is deleted together with the result
+        video_name = "video" + os.path.splitext(result["video_path"])[1]
+        video_path = os.path.join(final, video_name)
+        if os.path.abspath(result["video_path"]) != os.path.abspath(video_path):
+            shutil.move(result["video_path"], os.path.join(tmp, video_name))
+        elif os.path.exists(video_path):
+            os.replace(video_path, os.path.join(tmp, video_name))
+        table.save(os.path.join(tmp, "tracks.npz"))
+        with open(os.path.join(tmp, "stats.json"), "w") as f:
+            json.dump({str(pid): st for pid, st in result["stats"].items()}, f)
+        with open(os.path.join(tmp, "meta.json"), "w") as f:
+            json.dump({
+                "schema_version": SCHEMA_VERSION,
+                "model_hash":     model_hash,
+                "job_id":         job_id,
+                "video_path":     video_path,
+                "fps":            result["fps"],
+                "class_names":    {str(k): v for k, v in dict(result["class_names"]).items()},
+                "team_cols":      {str(k): list(v) for k, v in result["team_cols"].items()},
+                "saved":          time.time(),
+            }, f)
+        shutil.rmtree(final, ignore_errors=True)
+        os.replace(tmp, final)
+
+        self._remember(job_id, {**result, "video_path": video_path, "tracks": table, "model_hash": model_hash})
+        self.evict()
+
+    def evict(self) -> None:
+        for job_id in self.job_ids()[self.max_jobs:]:
+            with self.lock:
+                self.memory.pop(job_id, None)
+            shutil.rmtree(self._dir(job_id), ignore_errors=True)
+
+    def load(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self.lock:
+            if job_id in self.memory:
+                self.memory.move_to_end(job_id)
+                return self.memory[job_id]
+        directory = self._dir(job_id)
+        meta_path = os.path.join(directory, "meta.json")
+        if not os.path.exists(meta_path):
+            return None
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+            if meta.get("schema_version") != SCHEMA_VERSION:
+                print(f"[WARN] Result {job_id} has schema {meta.get('schema_version')}, expected {SCHEMA_VERSION}")
+                return None
+            with open(os.path.join(directory, "stats.json")) as f:
+                stats = {int(pid): st for pid, st in json.load(f).items()}
+            table = TrackTable.load(os.path.join(directory, "tracks.npz"))
+        except Exception as e:
+            print(f"[WARN] Could not load result {job_id}: {e}")
+            return None
+
+        result = {
+            "video_path":   meta["video_path"],
+            "tracks":       table,
+            "class_names":  {int(k): v for k, v in meta["class_names"].items()},
+            "stats":        stats,
+            "team_cols":    {int(k): tuple(v) for k, v in meta["team_cols"].items()},
+            "fps":          meta["fps"],
+            "model_hash":   meta["model_hash"],
+        }
+        self._remember(job_id, result)
+        return result
+
+    def job_ids(self) -> List[str]:
+        # stored jobs, newest first
+        if not os.path.isdir(self.root):
+            return []
+        metas = []
+        for name in os.listdir(self.root):
+            try:
+                metas.append((os.path.getmtime(os.path.join(self.root, name, "meta.json")), name))
+            except OSError:
+                continue    # not a finished result, or deleted meanwhile
+        return [name for _, name in sorted(metas, reverse=True)]
+
+    def latest(self) -> Optional[str]:
+        job_ids = self.job_ids()
+        return job_ids[0] if job_ids else None
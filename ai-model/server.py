@@ -1,24 +1,46 @@
-from fastapi import FastAPI, UploadFile, File
+from fastapi import FastAPI, UploadFile, File, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import StreamingResponse
 import uvicorn
 import cv2
+import os
+import json
 import time
+import shutil
+import asyncio
+from typing import Optional
 import numpy as np
-import supervision as sv
+from contextlib import asynccontextmanager
 
-from performance_evaluator import PerformanceEvaluator, estimate_player_value_advanced
-from deep_sort_tracker import DeepSortTracker
-from camera_movement_estimator import CameraMovementEstimator
-from view_transformer import ViewTransformer
+from performance_evaluator import PerformanceEvaluator, MatchEventEngine, estimate_player_value_advanced
+from deep_sort_tracker import DeepSortTracker, DetectionCache
+from camera_movement_estimator import CameraMovementEstimator, estimate_camera_motion_parallel
+from view_transformer import ViewTransformer, load_calibrations
+from view_transformer.view_transformer import DEFAULT_CALIBRATION_PATH
 from speed_and_distance_estimator import SpeedAndDistance_Estimator
 from team_assigner import TeamAssigner
 from player_ball_assigner import PlayerBallAssigner
 from Re_ID.track_postprocess import filter_short_lived_ids, reid_merge_tracks, keep_top_22_ids
 from Re_ID.reid_model import ReIDModel
-from utils.video_utils import read_video
+from model_registry import ModelRegistry
+from utils.video_utils import read_video, iter_video
+from streaming_pipeline import run_streaming_pipeline, streaming_detection_params
+from job_manager import JobManager
+from result_store import ResultStore
+from stage_cache import StageCache, code_hash
+from render_cache import RenderCache, RenderBusy, track_annotator
+from track_table import TrackTable
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # detector and Re-ID weights are loaded and warmed up once, before the first request
+    MODELS.load()
+    yield
+    # running jobs finish before the models are released; queued ones are cancelled
+    JOBS.shutdown(wait=True)
+    MODELS.close()
+
+app = FastAPI(lifespan=lifespan)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -26,89 +48,266 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-GLOBAL = {
-    "frames":       None,
-    "tracks":       None,
-    "yolo_results": None,
-    "stats":        None,
-    "team_cols":    None,
-    "fps":          24.0,
-}
+STAGE_CACHE_DIR   = os.path.join("cache", "stages")
+STAGE_CACHE_BYTES = 4 << 30
+STAGES          = StageCache(STAGE_CACHE_DIR, max_bytes=STAGE_CACHE_BYTES)
+DETECTION_CACHE = DetectionCache(stages=STAGES)    # same directory, memory map and eviction as STAGES
+JOBS            = JobManager(max_workers=2)
+RESULTS         = ResultStore("results", max_cached=4, max_jobs=50)
+RENDERS         = RenderCache(os.path.join("cache", "render"), max_bytes=2 << 30, max_producers=2)
+UPLOAD_DIR      = "uploads"
+CAMERA_CHUNK_SIZE = 1000
+REID_THRESHOLD    = 0.7
+FEED_WIDTHS       = (320, 640, 960, 1280, 1920)    # each preset is rendered and cached once per job
+FEED_QUALITIES    = (50, 70, 85)
+LIVE_INTERVAL     = 2.0    # seconds between live rating pushes
+LIVE_WINDOW       = 64     # frames tracked per live update in batch jobs
+LIVE_KEEPALIVE    = 15.0   # seconds of silence before a keep-alive comment
+# detector hardware settings; "auto" uses the GPU when there is one and the exported CPU model otherwise
+DETECTOR_DEVICE   = os.environ.get("SPAR_DEVICE", "auto")
+DETECTOR_IMGSZ    = int(os.environ.get("SPAR_IMGSZ", 640))
+CPU_THREADS       = int(os.environ.get("SPAR_CPU_THREADS", 0)) or None
+CPU_BACKEND       = os.environ.get("SPAR_CPU_BACKEND", "openvino") or None    # openvino, onnx or "" for PyTorch
+# detect every DETECTION_STRIDE-th frame (sooner while the camera pans) and predict boxes in between
+DETECTION_STRIDE  = int(os.environ.get("SPAR_DETECTION_STRIDE", 1))
+MODELS            = ModelRegistry("models/best.pt", device=DETECTOR_DEVICE, imgsz=DETECTOR_IMGSZ,
+                                  cpu_threads=CPU_THREADS, cpu_backend=CPU_BACKEND,
+                                  detection_stride=DETECTION_STRIDE)
 
-@app.post("/upload")
-async def upload_video(file: UploadFile = File(...)):
-    path = "uploaded_video.mp4"
-    with open(path, "wb") as f:
-        f.write(await file.read())
+def live_updates(fps: float, publish, interval: float = LIVE_INTERVAL):
+    # Provisional ratings while a job tracks. Every chunk feeds the evaluator's running engine
+    # (positions, speed and possession are estimated chunk-locally, on copies, so the final passes
+    # start from clean tracks); the ratings themselves are recomputed and pushed at most once per interval.
+    # prepare(chunk) fills in positions on the copy when the chunk does not carry them yet.
+    evaluator = PerformanceEvaluator(frame_rate=fps)
+    speed     = SpeedAndDistance_Estimator(frame_rate=fps)
+    assigner  = PlayerBallAssigner()
+    last_push = [0.0]
+
+    def on_chunk(chunk: Optional[dict] = None, force: bool = False, prepare=None) -> None:
+        if chunk is not None:
+            chunk = {
+                category: [{tid: dict(info) for tid, info in frame.items()} for frame in frames]
+                for category, frames in chunk.items()
+            }
+            if prepare is not None:
+                prepare(chunk)
+            speed.add_speed_and_distance_to_tracks(chunk)
+            assigner.assign_possession(chunk)
+            evaluator.update(chunk)
+        now = time.time()
+        if force or now - last_push[0] >= interval:
+            last_push[0] = now
+            publish(players_output(evaluator.current_ratings()))
 
+    return on_chunk
+
+def cached_stage(name: str, inputs: list, config: dict, compute, report) -> tuple:
+    # (value, key); compute() only runs when no entry matches the inputs, config and code version
+    key   = STAGES.make_key(name, *inputs, **config)
+    value = STAGES.get(key)
+    if value is None:
+        value = compute()
+        STAGES.put(key, value)
+    report(name)
+    return value, key
+
+def process_video(job_id: str, path: str, streaming: bool = False, calibration: str = "default",
+                  report=lambda stage, fraction=1.0: None, publish=lambda payload: None) -> dict:
     cap = cv2.VideoCapture(path)
     fps = cap.get(cv2.CAP_PROP_FPS) or 24.0
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+    frame_size = (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
     cap.release()
 
-    frames = read_video(path)
+    tracker     = MODELS.tracker()
+    transformer = ViewTransformer(profile=calibration, frame_size=frame_size if all(frame_size) else None)
 
-    tracker      = DeepSortTracker(model_path="models/best.pt", device="cuda")
-    yolo_results = tracker.detect_frames(frames)
+    # Every stage is cached under a key built from its inputs' keys, its config and its code, so a
+    # rerun only recomputes the stages after a change; the video is decoded only if a stage misses.
+    frames = []
 
-    tracks  = tracker.get_object_tracks(frames)
-    tracker.add_position_to_tracks(tracks)
+    def decoded() -> list:
+        if not frames:
+            report("decode", 0.0)
+            frames.extend(read_video(path))
+            report("decode")
+        return frames
 
-    cam     = CameraMovementEstimator(frames[0])
-    offsets = cam.get_camera_movement(frames)
-    cam.add_adjust_positions_to_tracks(tracks, offsets)
+    def video_frames():
+        return iter(frames) if frames else iter_video(path)
 
-    transformer = ViewTransformer()
-    transformer.add_transformed_position_to_tracks(tracks)
+    video_hash = STAGES.file_hash(path)
+    kinematics_config = dict(
+        calibration=calibration, frame_size=frame_size, fps=fps,
+        calibrations=STAGES.file_hash(DEFAULT_CALIBRATION_PATH),
+        code=code_hash(ViewTransformer, SpeedAndDistance_Estimator, DeepSortTracker),
+    )
 
-    tracks["ball"] = tracker.interpolate_ball_positions(tracks["ball"])
-    SpeedAndDistance_Estimator().add_speed_and_distance_to_tracks(tracks)
+    if streaming:
+        det_key = DETECTION_CACHE.make_key(path, tracker.model_path, **streaming_detection_params(tracker))
 
-    team  = TeamAssigner()
-    first = next((i for i,p in enumerate(tracks["players"]) if p), -1)
-    if first >= 0:
-        team.assign_team_color(frames[first], tracks["players"][first])
+        def stream() -> dict:
+            # frames are decoded window by window and re-read from disk by the later passes
+            live = live_updates(fps, publish)
+            tracks, _, _ = run_streaming_pipeline(
+                path, tracker, cache=DETECTION_CACHE, transformer=transformer, frame_rate=fps,
+                total_frames=total_frames,
+                progress=lambda fraction: report("streaming", fraction),
+                on_chunk=live,
+            )
+            live(force=True)
+            tracks["ball"] = tracker.interpolate_ball_positions(tracks["ball"])
+            return {"tracks": TrackTable.from_tracks(tracks)}
+
+        value, kinematics_key = cached_stage(
+            "streaming", [det_key], dict(kinematics_config, pipeline=code_hash(
+                run_streaming_pipeline, CameraMovementEstimator)),
+            stream, report,
+        )
+    else:
+        def camera() -> dict:
+            offsets = None
+            if total_frames > 2 * CAMERA_CHUNK_SIZE:
+                # long clips: estimate chunks in worker processes; fall back if a seek was not
+                # frame-accurate or the frame count disagrees
+                motion = estimate_camera_motion_parallel(path, chunk_size=CAMERA_CHUNK_SIZE)
+                if motion is not None and len(motion) == total_frames:
+                    offsets = motion[:, :2]
+            if offsets is None:
+                offsets = CameraMovementEstimator(decoded()[0]).get_camera_movement(decoded())
+            return {"offsets": np.asarray(offsets, dtype=np.float64).reshape(-1, 2)}
 
-    assigner = PlayerBallAssigner()
-    for i, players in enumerate(tracks["players"]):
-        for pid, info in players.items():
-            info["team"] = team.get_player_team(frames[i], info["bbox"], pid)
-        if 1 in tracks["ball"][i]:
-            pid = assigner.assign_ball_to_player(players, tracks["ball"][i][1]["bbox"])
-            if pid != -1:
-                players[pid]["has_ball"] = True
+        # camera motion comes first: the tracker picks its keyframes from it and moves its predictions with it
+        value, camera_key = cached_stage("camera_movement", [video_hash],
+                                         dict(code=code_hash(CameraMovementEstimator), chunk_size=CAMERA_CHUNK_SIZE),
+                                         camera, report)
+        offsets = value["offsets"]
+
+        def camera_motion():
+            return offsets if len(offsets) == len(decoded()) else None
+
+        # adaptive keyframes are picked from the camera motion, so the detection key names it by the
+        # camera stage's key; that also settles whether camera_motion() falls back to None for this video
+        det_key    = DETECTION_CACHE.make_key(path, tracker.model_path, **tracker.detection_params(camera_key))
+        detections = DETECTION_CACHE.get(det_key)
+        if detections is None:
+            detections = tracker.detect_video(
+                path, decoded(),
+                progress=lambda fraction: report("detection", fraction),
+                camera_motion=camera_motion(),
+            )
+            DETECTION_CACHE.put(det_key, detections)
+        report("detection")
 
-    filter_short_lived_ids(tracks)
-    reid_merge_tracks(tracks, frames, ReIDModel(), threshold=0.7)
-    keep_top_22_ids(tracks)
+        def track() -> dict:
+            # tracked window by window (DeepSort state carries over), so live ratings go out as it runs
+            live   = live_updates(fps, publish)
+            motion = camera_motion()
+            tracks = {"players": [], "referees": [], "ball": []}
+            for begin in range(0, len(decoded()), LIVE_WINDOW):
+                window = decoded()[begin:begin + LIVE_WINDOW]
+                shift  = motion[begin:begin + LIVE_WINDOW] if motion is not None else None
+                chunk  = tracker.track_frames(window, detections[begin:begin + LIVE_WINDOW], shift)
+                for category, rows in chunk.items():
+                    tracks[category].extend(rows)
 
-    stats = PerformanceEvaluator().evaluate_players_fifa_style(tracks)
+                def prepare(view, shift=np.zeros((len(window), 2)) if shift is None else shift):
+                    tracker.add_position_to_tracks(view)
+                    CameraMovementEstimator.add_adjust_positions_to_tracks(view, shift)
+                    transformer.add_transformed_position_to_tracks(view)
+                live(chunk, prepare=prepare)
+            live(force=True)
+            table = TrackTable.from_tracks(tracks)
+            tracker.add_position_to_tracks(table)
+            return {"tracks": table}
 
-    GLOBAL.update({
-        "frames":       frames,
+        value, tracking_key = cached_stage("tracking", [det_key, camera_key], dict(code=code_hash(DeepSortTracker)),
+                                           track, report)
+        tracked = value["tracks"]
+
+        def kinematics() -> dict:
+            shift = offsets
+            if len(tracked.frame) and len(shift) <= tracked.frame.max():
+                # the parallel estimate is sized by CAP_PROP_FRAME_COUNT, which can undercount the frames
+                # actually decoded; measure sequentially over the decoded frames instead
+                shift = CameraMovementEstimator(decoded()[0]).get_camera_movement(decoded())
+            CameraMovementEstimator.add_adjust_positions_to_tracks(tracked, shift)
+            transformer.add_transformed_position_to_tracks(tracked)
+            SpeedAndDistance_Estimator(frame_rate=fps).add_speed_and_distance_to_tracks(tracked)
+            # short ball gaps are filled in the table, flagged as interpolated
+            tracker.interpolate_ball_positions(tracked)
+            return {"tracks": tracked}
+
+        value, kinematics_key = cached_stage("kinematics", [tracking_key, camera_key], kinematics_config,
+                                             kinematics, report)
+
+    moving = value["tracks"]
+
+    def assign_teams() -> dict:
+        tracks = moving.to_tracks()
+        team = TeamAssigner()
+        for i, (players, frame) in enumerate(zip(tracks["players"], video_frames())):
+            team.observe(i, frame, players)
+        PlayerBallAssigner().assign_possession(tracks)
+        # the team model is fitted on colors sampled across the whole video, then every track gets
+        # its majority vote (0 = referee/goalkeeper-like outlier color)
+        team.fit()
+        team.resolve_teams()
+        for players in tracks["players"]:
+            for pid, info in players.items():
+                info["team"] = team.player_team_dict.get(pid, 0)
+        return {"tracks": TrackTable.from_tracks(tracks),
+                "team_cols": {str(k): list(v) for k, v in team.team_colors.items()}}
+
+    value, team_key = cached_stage("team", [kinematics_key],
+                                   dict(code=code_hash(TeamAssigner, PlayerBallAssigner)), assign_teams, report)
+    team_cols = {int(k): tuple(v) for k, v in value["team_cols"].items()}
+    teamed    = value["tracks"]
+
+    def reid() -> dict:
+        tracks = teamed.to_tracks()
+        filter_short_lived_ids(tracks)
+        reid_merge_tracks(tracks, video_frames(), MODELS.reid_model(), threshold=REID_THRESHOLD)
+        keep_top_22_ids(tracks)
+        return {"tracks": TrackTable.from_tracks(tracks)}
+
+    reid_config = dict(threshold=REID_THRESHOLD, weights=MODELS.reid_model().weights_hash(),
+                       code=code_hash(filter_short_lived_ids, reid_merge_tracks, keep_top_22_ids, ReIDModel))
+    value, reid_key = cached_stage("reid", [team_key], reid_config, reid, report)
+    tracks = value["tracks"]
+
+    def ratings() -> dict:
+        stats = PerformanceEvaluator(frame_rate=fps).evaluate_players_fifa_style(tracks)
+        return {"stats": {str(pid): st for pid, st in stats.items()}}
+
+    value, _ = cached_stage("rating", [reid_key], dict(fps=fps, code=code_hash(PerformanceEvaluator, MatchEventEngine)),
+                            ratings, report)
+    stats = {int(pid): st for pid, st in value["stats"].items()}
+    publish(players_output(stats))
+
+    # decoded frames and raw detections are not kept; the feed is drawn from the final tracks
+    RESULTS.save(job_id, {
+        "video_path":   path,
         "tracks":       tracks,
-        "yolo_results": yolo_results,
+        "class_names":  tracker.model.names,
         "stats":        stats,
-        "team_cols":    team.team_colors,
+        "team_cols":    team_cols,
         "fps":          fps,
-    })
-
-    output = []
-    for idx, (orig, st) in enumerate(
-        sorted(stats.items(), key=lambda x: x[1]["overall"], reverse=True),
-        start=1
-    ):
-        output.append({
-            "id":        idx,
-            "track_id":  orig,
-            **st,
-            "value":     estimate_player_value_advanced(st),
-        })
+    }, model_hash=DETECTION_CACHE.file_hash(tracker.model_path))
+    report("saved")
+    # the job keeps only a summary; results are read back from the store
+    return {"players": len(stats)}
 
-    return {"message": "Processed", "players": output}
+def run_job(job_id: str, path: str, **kwargs) -> dict:
+    # a stored result takes the upload with it; a failed job's upload is deleted here
+    try:
+        return process_video(job_id, path, **kwargs)
+    finally:
+        if os.path.exists(path):
+            os.remove(path)
 
-@app.get("/api/players")
-def get_players():
-    stats = GLOBAL["stats"] or {}
+def players_output(stats: dict) -> list:
     return [
         {
             "id":        idx,
@@ -122,60 +321,124 @@ def get_players():
         )
     ]
 
-@app.get("/video_feed")
-def video_feed():
-    frames       = GLOBAL["frames"]
-    yolo_results = GLOBAL["yolo_results"]
-    team_cols    = GLOBAL["team_cols"]
-    fps          = GLOBAL.get("fps", 24.0)
-    interval     = 1.0 / fps
-
-    palette = sv.ColorPalette.from_hex([
-        '#{:02X}{:02X}{:02X}'.format(*team_cols[1]),
-        '#{:02X}{:02X}{:02X}'.format(*team_cols[2]),
-        '#FFFF00',
-        '#FF0000',
-    ])
-    box_annotator   = sv.BoxAnnotator(color=palette, thickness=2)
-    label_annotator = sv.LabelAnnotator(
-        color=palette,
-        text_color=sv.Color.from_hex('#FFFFFF'),
-        text_scale=0.5
-    )
+def resolve_job_id(job_id: Optional[str]) -> Optional[str]:
+    # falls back to the newest stored result, which survives server restarts
+    return job_id or JOBS.latest_finished() or RESULTS.latest()
 
-    def gen():
-        for idx, frame in enumerate(frames):
-            start = time.time()
-
-            # convert the Ultralytics Results → Supervision Detections
-            result = yolo_results[idx]
-            dets   = sv.Detections.from_ultralytics(result)
-
-            # build labels from the model's names & confidences
-            labels = [
-                f"{result.names[cid]} {conf:.2f}"
-                for cid, conf in zip(dets.class_id, dets.confidence)
-            ]
-
-            # draw tight YOLO boxes + labels
-            annotated = box_annotator.annotate(scene=frame, detections=dets)
-            annotated = label_annotator.annotate(
-                scene      = annotated,
-                detections = dets,
-                labels     = np.array(labels)
-            )
+def finished_result(job_id: Optional[str]) -> Optional[dict]:
+    job_id = resolve_job_id(job_id)
+    return RESULTS.load(job_id) if job_id else None
+
+@app.get("/calibrations")
+def get_calibrations():
+    return sorted(load_calibrations().keys())
+
+@app.post("/upload")
+def upload_video(file: UploadFile = File(...), streaming: bool = False, calibration: str = "default"):
+    if calibration not in load_calibrations():
+        raise HTTPException(status_code=400, detail=f"Unknown calibration profile '{calibration}'")
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    job_id = JOBS.create()
+    path   = os.path.join(UPLOAD_DIR, f"{job_id}.mp4")
+    with open(path, "wb") as f:
+        shutil.copyfileobj(file.file, f)
+
+    JOBS.start(job_id, run_job, job_id, path, streaming=streaming, calibration=calibration)
+    return {"message": "Queued", "job_id": job_id}
 
-            annotated = cv2.resize(annotated, (640, 360))
-            _, jpg = cv2.imencode('.jpg', annotated)
+@app.get("/jobs/{job_id}")
+def get_job(job_id: str):
+    job = JOBS.status(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown job")
+    return job
 
+@app.get("/jobs/{job_id}/result")
+def get_job_result(job_id: str):
+    job = JOBS.outcome(job_id)
+    if job is not None and job["status"] == "failed":
+        raise HTTPException(status_code=500, detail=job["error"])
+    if job is not None and job["status"] != "done":
+        raise HTTPException(status_code=409, detail=f"Job is {job['status']}")
+    # the result is stored before the job is marked done
+    result = RESULTS.load(job_id)
+    if result is None:
+        raise HTTPException(status_code=404, detail="Unknown job")
+    return {"message": "Processed", "players": players_output(result["stats"])}
+
+@app.get("/jobs/{job_id}/live")
+async def job_live(job_id: str):
+    # Server-Sent Events: a "players" event whenever the job publishes new ratings,
+    # then a final "done" (or "failed") event; comments keep idle connections open
+    if JOBS.status(job_id) is None:
+        raise HTTPException(status_code=404, detail="Unknown job")
+
+    async def events():
+        # waits on an asyncio event set by the job, so an idle client holds no thread
+        changed = JOBS.listen(job_id)
+        version = 0
+        try:
+            while True:
+                # cleared before reading, so an update landing after the read still wakes the wait
+                changed.clear()
+                job = JOBS.live(job_id)
+                if job is None:
+                    return
+                if job["live_version"] != version:
+                    version = job["live_version"]
+                    yield f"event: players\ndata: {json.dumps(job['live'])}\n\n"
+                if job["status"] in ("done", "failed"):
+                    yield f"event: {job['status']}\ndata: {json.dumps(job['error'])}\n\n"
+                    return
+                try:
+                    await asyncio.wait_for(changed.wait(), timeout=LIVE_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+        finally:
+            JOBS.unlisten(job_id, changed)
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache"})
+
+@app.get("/api/players")
+def get_players(job_id: Optional[str] = None):
+    result = finished_result(job_id)
+    return players_output(result["stats"] if result else {})
+
+@app.get("/video_feed")
+def video_feed(job_id: Optional[str] = None, width: int = 640, quality: int = 85, start: int = 0):
+    # MJPEG of the annotated video: rendered once per job and preset by a shared producer, and
+    # replayed from disk afterwards; width and quality snap to the nearest preset, `start` seeks
+    # to a frame index
+    job_id = resolve_job_id(job_id)
+    result = RESULTS.load(job_id) if job_id else None
+    if result is None:
+        raise HTTPException(status_code=404, detail="No processed video")
+    width    = min(FEED_WIDTHS, key=lambda preset: abs(preset - width))
+    quality  = min(FEED_QUALITIES, key=lambda preset: abs(preset - quality))
+    start    = max(start, 0)
+    interval = 1.0 / result["fps"]
+
+    annotate = track_annotator(result["tracks"], result["team_cols"])
+    try:
+        jpegs = RENDERS.frames(
+            f"{job_id}_{code_hash(track_annotator)}",
+            lambda: iter_video(result["video_path"]), annotate, width, quality, start=start,
+        )
+    except RenderBusy:
+        raise HTTPException(status_code=503, detail="Too many videos rendering, retry shortly",
+                            headers={"Retry-After": "5"})
+
+    def gen():
+        for jpg in jpegs:
+            begin = time.time()
             yield (
                 b"--frame\r\n"
                 b"Content-Type: image/jpeg\r\n\r\n"
-                + jpg.tobytes()
+                + jpg
                 + b"\r\n"
             )
-
-            elapsed = time.time() - start
+            elapsed = time.time() - begin
             if elapsed < interval:
                 time.sleep(interval - elapsed)
 
@@ -1,45 +1,124 @@
 import cv2
 import sys
+import numpy as np
+from typing import Optional
+from scipy.signal import savgol_filter
 sys.path.append('../')
-from utils.bbox_utils import measure_distance, get_foot_position
+from utils.bbox_utils import get_foot_position
+from track_table import TrackTable, CATEGORIES
 
 class SpeedAndDistance_Estimator:
     
-    def __init__(self):
-        self.frame_window = 5
-        self.frame_rate = 24
+    def __init__(self, frame_rate: float = 24.0, smoothing: Optional[str] = "window",
+                 smoothing_window: int = 5, polyorder: int = 2, max_speed_kmh: float = 40.0,
+                 max_gap_seconds: float = 1.0, jump_window_seconds: float = 0.2):
+        self.frame_rate = float(frame_rate) if frame_rate and frame_rate > 0 else 24.0
+        self.smoothing = smoothing              # "window", "savgol" or None
+        self.smoothing_window = smoothing_window
+        self.polyorder = polyorder
+        # a step faster than this is treated as an ID switch, not movement
+        self.max_speed_kmh = max_speed_kmh
+        self.max_gap_seconds = max_gap_seconds
+        # the speed limit is checked over this span, so per-frame position jitter does not trip it
+        self.jump_window_seconds = jump_window_seconds
 
     def add_speed_and_distance_to_tracks(self, tracks: dict) -> None:
-        total_distance = {}
+        if isinstance(tracks, TrackTable):
+            self._add_speed_and_distance_to_table(tracks)
+            return
 
-        for category, object_tracks in tracks.items():
-            if category in ["ball", "referees"]:
+        table = TrackTable.from_tracks(tracks)
+        self._add_speed_and_distance_to_table(table)
+        # rows of from_tracks follow frame -> category -> dict order, so walk the dicts the same way
+        row = 0
+        for frame_idx in range(table.n_frames):
+            for category in CATEGORIES:
+                object_tracks = tracks.get(category, [])
+                if frame_idx >= len(object_tracks):
+                    continue
+                for info in object_tracks[frame_idx].values():
+                    if not np.isnan(table.speed[row]):
+                        info['speed'] = float(table.speed[row])
+                        info['distance'] = float(table.distance[row])
+                        info['acceleration'] = float(table.acceleration[row])
+                    row += 1
+
+    def _smooth(self, points: np.ndarray) -> np.ndarray:
+        window = min(self.smoothing_window, len(points))
+        if self.smoothing == "savgol":
+            window -= 1 - window % 2    # savgol needs an odd window
+            if window > self.polyorder:
+                return savgol_filter(points, window, self.polyorder, axis=0, mode='interp')
+            return points
+        if self.smoothing == "window" and window > 1:
+            # centered mean whose half-width shrinks towards the segment ends, so steady motion is not
+            # pulled back at the first and last frames
+            n = len(points)
+            idx = np.arange(n)
+            half = np.minimum((window - 1) // 2, np.minimum(idx, n - 1 - idx))
+            csum = np.concatenate([np.zeros((1, points.shape[1])), np.cumsum(points, axis=0)])
+            return (csum[idx + half + 1] - csum[idx - half]) / (2 * half + 1)[:, None]
+        return points
+
+    def _jumps(self, times: np.ndarray, positions: np.ndarray, breaks: np.ndarray) -> np.ndarray:
+        # Average speed over the last jump_window_seconds (within a segment) above max_speed_kmh. A real
+        # jump keeps that average high for a whole window of rows; the break goes at the run's biggest step.
+        n = len(times)
+        jumps = np.zeros(n - 1, dtype=bool)
+        if n < 2:
+            return jumps
+        window = max(1, int(round(self.jump_window_seconds * self.frame_rate)))
+        segment_start = np.maximum.accumulate(np.where(np.concatenate([[True], breaks]), np.arange(n), 0))
+        back = np.maximum(np.arange(n) - window, segment_start)
+        distance = np.linalg.norm(positions - positions[back], axis=1)
+        elapsed = times - times[back]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            flagged = (back < np.arange(n)) & (distance / elapsed * 3.6 > self.max_speed_kmh)
+        step = np.concatenate([[0.0], np.linalg.norm(np.diff(positions, axis=0), axis=1)])
+        run_edges = np.diff(np.concatenate([[0], flagged.astype(np.int8), [0]]))
+        for start, end in zip(np.flatnonzero(run_edges == 1), np.flatnonzero(run_edges == -1)):
+            # runs never cross a segment start: the window there is empty, so that row is not flagged
+            row = start + int(np.argmax(step[start:end]))
+            jumps[row - 1] = True
+        return jumps
+
+    def _add_speed_and_distance_to_table(self, table: TrackTable) -> None:
+        rows = np.flatnonzero(table.category_mask('players') & ~np.isnan(table.position_transformed).any(axis=1))
+        if len(rows) == 0:
+            return
+        rows = rows[np.lexsort((table.frame[rows], table.track_id[rows]))]
+        track_ids = table.track_id[rows]
+        times = table.frame[rows] / self.frame_rate
+        positions = table.position_transformed[rows].astype(np.float64)
+
+        # split at track boundaries, long gaps and implausible jumps (ID switches)
+        dt = np.diff(times)
+        breaks = (track_ids[1:] != track_ids[:-1]) | (dt > self.max_gap_seconds)
+        breaks |= self._jumps(times, positions, breaks)
+        segment_starts = np.concatenate([[0], np.flatnonzero(breaks) + 1, [len(rows)]])
+
+        speed = np.zeros(len(rows))
+        acceleration = np.zeros(len(rows))
+        smoothed = positions.copy()
+        for start, end in zip(segment_starts[:-1], segment_starts[1:]):
+            if end - start < 2:
                 continue
-            number_of_frames = len(object_tracks)
-            for start_frame in range(0, number_of_frames, self.frame_window):
-                end_frame = min(start_frame + self.frame_window, number_of_frames - 1)
-                for track_id, _ in object_tracks[start_frame].items():
-                    if track_id not in object_tracks[end_frame]:
-                        continue
-                    start_pos = object_tracks[start_frame][track_id].get('position_transformed')
-                    end_pos = object_tracks[end_frame][track_id].get('position_transformed')
-                    if start_pos is None or end_pos is None:
-                        continue
-                    dist_covered = measure_distance(start_pos, end_pos)
-                    time_elapsed = (end_frame - start_frame) / self.frame_rate
-                    speed_m_s = dist_covered / time_elapsed if time_elapsed > 0 else 0
-                    speed_kmh = speed_m_s * 3.6
+            t = times[start:end]
+            smoothed[start:end] = self._smooth(positions[start:end])
+            velocity = np.gradient(smoothed[start:end], t, axis=0)
+            speed[start:end] = np.linalg.norm(velocity, axis=1)
+            acceleration[start:end] = np.gradient(speed[start:end], t)
 
-                    if category not in total_distance:
-                        total_distance[category] = {}
-                    if track_id not in total_distance[category]:
-                        total_distance[category][track_id] = 0
-                    total_distance[category][track_id] += dist_covered
+        # cumulative distance per track, never counting the step across a break
+        step = np.linalg.norm(np.diff(smoothed, axis=0), axis=1)
+        step[breaks] = 0.0
+        total = np.concatenate([[0.0], np.cumsum(step)])
+        track_starts = np.concatenate([[0], np.flatnonzero(track_ids[1:] != track_ids[:-1]) + 1])
+        total -= np.repeat(total[track_starts], np.diff(np.concatenate([track_starts, [len(rows)]])))
 
-                    for frame_idx in range(start_frame, end_frame):
-                        if track_id in object_tracks[frame_idx]:
-                            object_tracks[frame_idx][track_id]['speed'] = speed_kmh
-                            object_tracks[frame_idx][track_id]['distance'] = total_distance[category][track_id]
+        table.speed[rows] = speed * 3.6
+        table.distance[rows] = total
+        table.acceleration[rows] = acceleration
 
     def draw_speed_and_distance(self, frames: list, tracks: dict) -> list:
         output_frames = []
@@ -0,0 +1 @@
+from .stage_cache import StageCache, code_hash
\ No newline at end of file
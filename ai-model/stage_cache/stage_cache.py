@@ -0,0 +1,206 @@
+import os
+import json
+import time
+import shutil
+import tempfile
+import hashlib
+import inspect
+import threading
+import numpy as np
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+import sys
+sys.path.append('../')
+from track_table import TrackTable
+
+def code_hash(*objects: Any) -> str:
+    # version of a stage's implementation: the source of the modules defining these objects,
+    # so editing a formula or a threshold in any of them changes the stage key
+    digest = hashlib.sha256()
+    for obj in objects:
+        try:
+            digest.update(inspect.getsource(inspect.getmodule(obj) or obj).encode())
+        except (OSError, TypeError):
+            digest.update(repr(obj).encode())
+    return digest.hexdigest()[:16]
+
+def _copy(value: Any) -> Any:
+    if isinstance(value, TrackTable):
+        return value.select(np.ones(len(value), dtype=bool))
+    if isinstance(value, np.ndarray):
+        return value.copy()
+    if isinstance(value, list) and all(isinstance(v, np.ndarray) for v in value):
+        return [v.copy() for v in value]
+    return json.loads(json.dumps(value))
+
+class StageCache:
+    # Content-addressed cache for pipeline stages. A key hashes the stage name, the keys (or file hashes)
+    # of its inputs and its config, so changing anything upstream changes every key after it.
+    # An entry is a directory with one file per component:
+    #   TrackTable -> <name>.table.npz, ndarray -> <name>.array.npy,
+    #   list of (N, D) arrays -> <name>.arrays.npz (rows + counts), anything else -> <name>.json
+    # The directory is kept under max_bytes by evicting the least recently used entries.
+
+    def __init__(self, cache_dir: str = "cache/stages", max_bytes: int = 2 << 30,
+                 max_memory_entries: int = 8, max_file_hashes: int = 256) -> None:
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.max_memory_entries = max_memory_entries
+        self.memory: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        # one entry per hashed file (every upload), least recently used dropped past max_file_hashes
+        self.max_file_hashes = max_file_hashes
+        self._file_hashes: "OrderedDict[Tuple[str, float, int], str]" = OrderedDict()
+        self.lock = threading.Lock()
+        self.evict_lock = threading.Lock()
+        self.stale_tmp_seconds = 3600.0
+
+    def file_hash(self, path: str, chunk_size: int = 1 << 20) -> str:
+        # weights rarely change, so skip re-hashing while size and mtime match
+        stat = os.stat(path)
+        stamp = (os.path.abspath(path), stat.st_mtime, stat.st_size)
+        with self.lock:
+            if stamp in self._file_hashes:
+                self._file_hashes.move_to_end(stamp)
+                return self._file_hashes[stamp]
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(chunk_size), b''):
+                digest.update(chunk)
+        with self.lock:
+            self._file_hashes[stamp] = digest.hexdigest()
+            while len(self._file_hashes) > self.max_file_hashes:
+                self._file_hashes.popitem(last=False)
+        return digest.hexdigest()
+
+    def make_key(self, stage: str, *inputs: str, **config) -> str:
+        digest = hashlib.sha256()
+        digest.update(stage.encode())
+        for value in inputs:
+            digest.update(f"|{value}".encode())
+        for name in sorted(config):
+            digest.update(f"|{name}={config[name]}".encode())
+        return f"{stage}-{digest.hexdigest()[:32]}"
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key)
+
+    def _remember(self, key: str, value: Dict[str, Any]) -> None:
+        with self.lock:
+            self.memory[key] = value
+            self.memory.move_to_end(key)
+            while len(self.memory) > self.max_memory_entries:
+                self.memory.popitem(last=False)
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        # components are copied, so callers may modify what they get back
+        with self.lock:
+            value = self.memory.get(key)
+            if value is not None:
+                self.memory.move_to_end(key)
+        path = self._path(key)
+        if value is None:
+            if not os.path.isdir(path):
+                return None
+            try:
+                value = {}
+                for filename in os.listdir(path):
+                    name, kind = filename.split('.')[:2]
+                    full = os.path.join(path, filename)
+                    if kind == "table":
+                        value[name] = TrackTable.load(full)
+                    elif kind == "array":
+                        value[name] = np.load(full)
+                    elif kind == "arrays":
+                        with np.load(full) as data:
+                            rows, counts = data["rows"], data["counts"]
+                        value[name] = np.split(rows, np.cumsum(counts)[:-1]) if len(counts) else []
+                    else:
+                        with open(full) as f:
+                            value[name] = json.load(f)
+            except Exception as e:
+                print(f"[WARN] Could not load cached stage {key}: {e}")
+                return None
+            self._remember(key, value)
+        try:
+            os.utime(path)      # recency for eviction
+        except OSError:
+            pass
+        return {name: _copy(component) for name, component in value.items()}
+
+    def put(self, key: str, value: Dict[str, Any]) -> None:
+        self._remember(key, {name: _copy(component) for name, component in value.items()})
+        path = self._path(key)
+        tmp = None
+        try:
+            # a staging directory per write, so jobs computing the same key never mix their files
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp = tempfile.mkdtemp(prefix=f"{key}.", suffix=".tmp", dir=self.cache_dir)
+            for name, component in value.items():
+                if isinstance(component, TrackTable):
+                    component.save(os.path.join(tmp, f"{name}.table.npz"))
+                elif isinstance(component, np.ndarray):
+                    np.save(os.path.join(tmp, f"{name}.array.npy"), component)
+                elif isinstance(component, list) and all(isinstance(v, np.ndarray) for v in component):
+                    counts = np.array([len(v) for v in component], dtype=np.int64)
+                    rows = np.concatenate(component) if component else np.zeros((0, 6), dtype=np.float32)
+                    np.savez_compressed(os.path.join(tmp, f"{name}.arrays.npz"), rows=rows, counts=counts)
+                else:
+                    with open(os.path.join(tmp, f"{name}.json"), "w") as f:
+                        json.dump(component, f)
+            self._publish(tmp, path)
+        except Exception as e:
+            print(f"[WARN] Could not save cached stage {key}: {e}")
+            if tmp is not None:
+                shutil.rmtree(tmp, ignore_errors=True)
+            return
+        self.evict()
+
+    def _publish(self, tmp: str, path: str, attempts: int = 3) -> None:
+        # renames the staged entry into place; an entry already there (a stale one, or another job's
+        # copy of the same value) is first moved aside in one rename, so readers never see it half deleted
+        for attempt in range(attempts):
+            try:
+                os.replace(tmp, path)
+                return
+            except OSError:
+                if not os.path.isdir(path):
+                    raise
+            if attempt == attempts - 1:
+                break
+            trash = tempfile.mkdtemp(suffix=".tmp", dir=self.cache_dir)
+            try:
+                os.replace(path, os.path.join(trash, "old"))
+            except OSError:
+                pass
+            shutil.rmtree(trash, ignore_errors=True)
+        # still losing to concurrent writers of the same key; theirs is as good as this one
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    def evict(self) -> None:
+        # drops least recently used entries until the cache fits in max_bytes; entries may be replaced
+        # or removed by another job meanwhile, so each one is measured on its own and skipped if it vanished
+        with self.evict_lock:
+            entries = []
+            for name in os.listdir(self.cache_dir):
+                path = self._path(name)
+                if name.endswith(".tmp"):
+                    # staging directories left behind by a crashed writer
+                    try:
+                        if time.time() - os.path.getmtime(path) > self.stale_tmp_seconds:
+                            shutil.rmtree(path, ignore_errors=True)
+                    except OSError:
+                        pass
+                    continue
+                try:
+                    size = sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path))
+                    entries.append((os.path.getmtime(path), size, name))
+                except OSError:
+                    continue
+            total = sum(size for _, size, _ in entries)
+            for _, size, name in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                shutil.rmtree(self._path(name), ignore_errors=True)
+                with self.lock:
+                    self.memory.pop(name, None)
+                total -= size
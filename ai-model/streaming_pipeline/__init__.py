@@ -0,0 +1 @@
+from .streaming_pipeline import run_streaming_pipeline, streaming_detection_params
\ No newline at end of file
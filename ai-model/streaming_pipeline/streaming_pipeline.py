@@ -0,0 +1,107 @@
+import sys
+sys.path.append('../')
+import numpy as np
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from deep_sort_tracker import DeepSortTracker, DetectionCache, detections_to_arrays
+from camera_movement_estimator import CameraMovementEstimator
+from view_transformer import ViewTransformer
+from speed_and_distance_estimator import SpeedAndDistance_Estimator
+from stage_cache import code_hash
+from utils.video_utils import iter_video, iter_windows
+
+# Each stage consumes the previous one lazily, so at most one window of decoded
+# frames is alive at a time. Camera motion is measured first so the tracker can
+# pick its keyframes from it; frames are dropped after detection and later
+# stages only see the per-frame track dicts. Speed needs whole tracks for
+# smoothing, so it runs once over the collected tracks, which hold no pixels.
+
+def streaming_detection_params(tracker: DeepSortTracker) -> Dict[str, Any]:
+    # streamed keyframes follow camera_stage's window-by-window estimate, named by its code in the cache key
+    return tracker.detection_params("streaming:" + code_hash(CameraMovementEstimator))
+
+def decode_stage(video_path: str, window_size: int) -> Iterator[List[np.ndarray]]:
+    return iter_windows(iter_video(video_path), window_size)
+
+def camera_stage(
+    windows: Iterable[List[np.ndarray]],
+    camera_movement: Optional[list] = None
+) -> Iterator[Tuple[List[np.ndarray], list]]:
+    estimator = None
+    for frames in windows:
+        if estimator is None:
+            estimator = CameraMovementEstimator(frames[0])
+        offsets = estimator.update_camera_movement(frames)
+        if camera_movement is not None:
+            camera_movement.extend(offsets)
+        yield frames, offsets
+
+def detection_stage(
+    items: Iterable[Tuple[List[np.ndarray], list]],
+    tracker: DeepSortTracker,
+    detections: Optional[List[np.ndarray]] = None,
+    collected: Optional[List[np.ndarray]] = None
+) -> Iterator[Dict[str, List[Dict[Any, Any]]]]:
+    offset = 0
+    for frames, offsets in items:
+        if detections is not None:
+            window_detections = detections[offset: offset + len(frames)]
+        else:
+            keyframes = tracker.select_keyframes(len(frames), offsets)
+            window_detections = detections_to_arrays(tracker.detect_frames(frames, keyframes=keyframes))
+            if collected is not None:
+                collected.extend(window_detections)
+        offset += len(frames)
+        chunk = tracker.track_frames(frames, window_detections, offsets)
+        tracker.add_position_to_tracks(chunk)
+        CameraMovementEstimator.add_adjust_positions_to_tracks(chunk, offsets)
+        yield chunk
+
+def view_transform_stage(
+    chunks: Iterable[Dict[str, List[Dict[Any, Any]]]],
+    transformer: Optional[ViewTransformer] = None
+) -> Iterator[Dict[str, List[Dict[Any, Any]]]]:
+    transformer = transformer or ViewTransformer()
+    for chunk in chunks:
+        transformer.add_transformed_position_to_tracks(chunk)
+        yield chunk
+
+def run_streaming_pipeline(
+    video_path: str,
+    tracker: DeepSortTracker,
+    window_size: int = 64,
+    cache: Optional[DetectionCache] = None,
+    transformer: Optional[ViewTransformer] = None,
+    frame_rate: float = 24.0,
+    total_frames: int = 0,
+    progress: Optional[Callable[[float], None]] = None,
+    on_chunk: Optional[Callable[[Dict[str, List[Dict[Any, Any]]]], None]] = None
+) -> Tuple[Dict[str, List[Dict[Any, Any]]], list, List[np.ndarray]]:
+    detections, key = None, None
+    tracker.reset_keyframes()
+    if cache is not None:
+        key = cache.make_key(video_path, tracker.model_path, **streaming_detection_params(tracker))
+        detections = cache.get(key)
+
+    collected = []
+    camera_movement = []
+    windows = decode_stage(video_path, window_size)
+    chunks = view_transform_stage(detection_stage(
+        camera_stage(windows, camera_movement), tracker, detections, collected
+    ), transformer)
+
+    tracks = {"players": [], "referees": [], "ball": []}
+    for chunk in chunks:
+        for category, object_tracks in chunk.items():
+            tracks[category].extend(object_tracks)
+        if on_chunk:
+            on_chunk(chunk)
+        if progress and total_frames:
+            progress(len(tracks["players"]) / total_frames)
+
+    SpeedAndDistance_Estimator(frame_rate=frame_rate).add_speed_and_distance_to_tracks(tracks)
+
+    if detections is None:
+        detections = collected
+        if cache is not None:
+            cache.put(key, detections)
+    return tracks, camera_movement, detections
@@ -1,70 +1,157 @@
 from sklearn.cluster import KMeans
 import numpy as np
 import cv2
-from typing import Dict, Any
+from typing import Dict, Any, List
 
 class TeamAssigner:
 
-    def __init__(self) -> None:
+    def __init__(self, crop_size: int = 16, kmeans_iterations: int = 6, votes_per_track: int = 15,
+                 reservoir_size: int = 512, sample_interval: int = 10, learning_rate: float = 0.05,
+                 outlier_mads: float = 3.0, seed: int = 0) -> None:
         self.team_colors: Dict[int, tuple] = {}
         self.player_team_dict: Dict[int, int] = {}
+        self.team_votes: Dict[int, np.ndarray] = {}
+        self.outlier_ids: set = set()
+        # every crop's top half is resized to crop_size x crop_size before clustering
+        self.crop_size = crop_size
+        self.kmeans_iterations = kmeans_iterations
+        # color samples kept per track
+        self.votes_per_track = votes_per_track
 
-    def get_clustering_model(self, image: np.ndarray) -> KMeans:
-        lab = cv2.cvtColor(image, cv2.COLOR_BGR2LAB)
-        image_2d = lab.reshape(-1, 3)
-        kmeans = KMeans(n_clusters=2, init="k-means++", n_init=1)
-        kmeans.fit(image_2d)
-        return kmeans
+        # multi-frame model: each track keeps a reservoir of up to votes_per_track color samples taken
+        # every sample_interval frames, and all samples feed a global reservoir of reservoir_size colors,
+        # so fitting cost does not grow with the video length
+        self.reservoir_size = reservoir_size
+        self.sample_interval = sample_interval
+        self.learning_rate = learning_rate
+        self.outlier_mads = outlier_mads
+        self.rng = np.random.default_rng(seed)
+        self.reservoir = np.zeros((0, 3), dtype=np.float64)
+        self.reservoir_seen = 0
+        self.track_samples: Dict[int, List[tuple]] = {}
+        self.track_seen: Dict[int, int] = {}
+        self.track_last_frame: Dict[int, int] = {}
 
-    def get_player_color(self, frame: np.ndarray, bbox: list) -> np.ndarray:
-        x1, y1, x2, y2 = map(int, bbox)
-        image = frame[y1:y2, x1:x2]
-        if image.size == 0:
-            return np.array([0, 128, 128], dtype=np.float32)
-        top_half_image = image[0:int(image.shape[0] / 2), :]
-        kmeans = self.get_clustering_model(top_half_image)
-        labels = kmeans.labels_
-        clustered_image = labels.reshape(top_half_image.shape[0], top_half_image.shape[1])
-        corner_clusters = [
-            clustered_image[0, 0],
-            clustered_image[0, -1],
-            clustered_image[-1, 0],
-            clustered_image[-1, -1]
-        ]
-        non_player_cluster = max(set(corner_clusters), key=corner_clusters.count)
-        player_cluster = 1 - non_player_cluster
-        return kmeans.cluster_centers_[player_cluster]
+    def get_player_colors(self, frame: np.ndarray, bboxes: List[list]) -> np.ndarray:
+        # (N, 3) LAB shirt colors: a 2-cluster k-means per crop, run for all crops of the frame at once
+        size = self.crop_size
+        crops = np.zeros((len(bboxes), size, size, 3), dtype=np.uint8)
+        valid = np.zeros(len(bboxes), dtype=bool)
+        frame_h, frame_w = frame.shape[:2]
+        for i, bbox in enumerate(bboxes):
+            x1, y1, x2, y2 = map(int, bbox)
+            x1, y1 = max(x1, 0), max(y1, 0)
+            x2, y2 = min(x2, frame_w), min(y2, frame_h)
+            top_half = frame[y1:y1 + max((y2 - y1) // 2, 0), x1:x2]
+            if top_half.size == 0:
+                continue
+            crops[i] = cv2.resize(top_half, (size, size), interpolation=cv2.INTER_AREA)
+            valid[i] = True
 
-    def assign_team_color(self, frame: np.ndarray, player_detections: Dict[Any, Any]) -> None:
-        if not player_detections:
-            print("Warning: No player detections available for team assignment.")
+        colors = np.tile(np.array([0, 128, 128], dtype=np.float32), (len(bboxes), 1))
+        if not valid.any():
+            return colors
+
+        lab = cv2.cvtColor(crops[valid].reshape(-1, size, 3), cv2.COLOR_BGR2LAB)
+        pixels = lab.reshape(-1, size * size, 3).astype(np.float32)            # (M, P, 3)
+        corners = np.array([0, size - 1, size * (size - 1), size * size - 1])
+        center = pixels.reshape(-1, size, size, 3)[:, size // 4: 3 * size // 4, size // 4: 3 * size // 4]
+
+        # start from "background" = mean of the corners and "shirt" = mean of the middle of the crop
+        centers = np.stack([pixels[:, corners].mean(axis=1), center.reshape(len(pixels), -1, 3).mean(axis=1)], axis=1)
+        for _ in range(self.kmeans_iterations):
+            distances = ((pixels[:, :, None, :] - centers[:, None, :, :]) ** 2).sum(axis=-1)   # (M, P, 2)
+            labels = distances.argmin(axis=-1)
+            for k in range(2):
+                member = (labels == k)[..., None]
+                counts = member.sum(axis=1)
+                sums = (pixels * member).sum(axis=1)
+                centers[:, k] = np.where(counts > 0, sums / np.maximum(counts, 1), centers[:, k])
+
+        # as before, the cluster that owns most corners is the background
+        non_player = (labels[:, corners].sum(axis=1) >= 2).astype(int)
+        colors[valid] = centers[np.arange(len(pixels)), 1 - non_player]
+        return colors
+
+    def _add_to_reservoir(self, lab_colors: np.ndarray) -> None:
+        for color in lab_colors:
+            self.reservoir_seen += 1
+            if len(self.reservoir) < self.reservoir_size:
+                self.reservoir = np.vstack([self.reservoir, color])
+            else:
+                slot = self.rng.integers(self.reservoir_seen)
+                if slot < self.reservoir_size:
+                    self.reservoir[slot] = color
+
+    def observe(self, frame_idx: int, frame: np.ndarray, player_detections: Dict[Any, Any]) -> None:
+        # Per-track reservoir sampling: whether an observation is kept is decided before its color is
+        # computed, so each track costs about k * (1 + ln(n / k)) color extractions over its lifetime.
+        k = self.votes_per_track
+        chosen = []
+        for pid in player_detections:
+            if frame_idx - self.track_last_frame.get(pid, -self.sample_interval) < self.sample_interval:
+                continue
+            self.track_last_frame[pid] = frame_idx
+            seen = self.track_seen.get(pid, 0) + 1
+            self.track_seen[pid] = seen
+            samples = self.track_samples.setdefault(pid, [])
+            if len(samples) < k:
+                chosen.append((pid, None))
+            else:
+                slot = self.rng.integers(seen)
+                if slot < k:
+                    chosen.append((pid, int(slot)))
+        if not chosen:
             return
-        lab_colors = []
-        for _, detection in player_detections.items():
-            bbox = detection["bbox"]
-            lab_color = self.get_player_color(frame, bbox)
-            lab_colors.append(lab_color)
-        if not lab_colors:
-            print("Warning: No LAB colors extracted from player detections.")
+        colors = self.get_player_colors(frame, [player_detections[pid]["bbox"] for pid, _ in chosen])
+        colors = colors.astype(np.float64)
+        for (pid, slot), color in zip(chosen, colors):
+            if slot is None:
+                self.track_samples[pid].append((frame_idx, color))
+            else:
+                self.track_samples[pid][slot] = (frame_idx, color)
+        self._add_to_reservoir(colors)
+
+    def fit(self) -> None:
+        # 2-means on the bounded reservoir, plus a robust distance threshold for off-team colors
+        if len(self.reservoir) < 2:
+            print("Warning: Not enough player colors sampled for team assignment.")
             return
-        lab_colors = np.array(lab_colors, dtype=np.float64)
         kmeans = KMeans(n_clusters=2, init="k-means++", n_init=10)
-        kmeans.fit(lab_colors)
-        lab_centers = kmeans.cluster_centers_.reshape(1, -1, 3).astype(np.uint8)
+        kmeans.fit(self.reservoir)
+        self.kmeans = kmeans
+        distances = np.sqrt(((self.reservoir[:, None, :] - kmeans.cluster_centers_[None]) ** 2).sum(-1)).min(1)
+        median = np.median(distances)
+        mad = np.median(np.abs(distances - median)) * 1.4826
+        self.outlier_distance = median + self.outlier_mads * max(mad, 1.0)
+
+        lab_centers = kmeans.cluster_centers_.reshape(1, -1, 3).clip(0, 255).astype(np.uint8)
         bgr_centers = cv2.cvtColor(lab_centers, cv2.COLOR_Lab2BGR)[0]
         self.team_colors[1] = tuple(map(int, bgr_centers[0]))
         self.team_colors[2] = tuple(map(int, bgr_centers[1]))
-        self.kmeans = kmeans
 
-    def get_player_team(self, frame: np.ndarray, player_bbox: list, player_id: int) -> int:
+    def resolve_teams(self) -> Dict[int, int]:
+        # Replays the sampled colors in time order. Team centers follow slow lighting changes with an
+        # online update; colors far from both centers (referees, goalkeepers) vote for "no team" (0).
         if not hasattr(self, 'kmeans'):
-            return 1
-        if player_id in self.player_team_dict:
-            return self.player_team_dict[player_id]
-        lab_color = self.get_player_color(frame, player_bbox).reshape(1, -1).astype(np.float64)
-        team_index = int(self.kmeans.predict(lab_color)[0])
-        team_id = team_index + 1
-        if player_id == 91:
-            team_id = 1
-        self.player_team_dict[player_id] = team_id
-        return team_id
+            return self.player_team_dict
+        centers = self.kmeans.cluster_centers_.astype(np.float64).copy()
+        samples = sorted(
+            (frame_idx, pid, color)
+            for pid, track in self.track_samples.items()
+            for frame_idx, color in track
+        )
+        votes = {pid: np.zeros(3) for pid in self.track_samples}
+        for frame_idx, pid, color in samples:
+            distances = np.sqrt(((centers - color) ** 2).sum(axis=1))
+            team_index = int(distances.argmin())
+            if distances[team_index] > self.outlier_distance:
+                votes[pid][0] += 1
+                continue
+            votes[pid][team_index + 1] += 1
+            centers[team_index] += self.learning_rate * (color - centers[team_index])
+
+        self.team_votes = {pid: v[1:] for pid, v in votes.items()}
+        self.outlier_ids = {pid for pid, v in votes.items() if v.sum() and v.argmax() == 0}
+        self.player_team_dict = {pid: int(v.argmax()) for pid, v in votes.items() if v.sum()}
+        return self.player_team_dict
@@ -0,0 +1 @@
+from .track_table import TrackTable, CATEGORIES
\ No newline at end of file
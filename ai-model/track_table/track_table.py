@@ -0,0 +1,156 @@
+import numpy as np
+from typing import Any, Dict, List, Optional
+
+CATEGORIES = ("players", "referees", "ball")
+
+# column name -> (dtype, trailing shape, fill value for rows that have no value yet)
+COLUMNS = {
+    "frame":                (np.int32,   (),   -1),
+    "track_id":             (np.int64,   (),   -1),
+    "category":             (np.int8,    (),   -1),
+    "bbox":                 (np.float32, (4,), np.nan),
+    "conf":                 (np.float32, (),   np.nan),
+    "position":             (np.float32, (2,), np.nan),
+    "position_adjusted":    (np.float32, (2,), np.nan),
+    "position_transformed": (np.float32, (2,), np.nan),
+    "speed":                (np.float32, (),   np.nan),
+    "distance":             (np.float32, (),   np.nan),
+    "acceleration":         (np.float32, (),   np.nan),
+    "team":                 (np.int8,    (),   0),
+    "has_ball":             (np.bool_,   (),   False),
+    "interpolated":         (np.bool_,   (),   False),
+    "predicted":            (np.bool_,   (),   False),
+}
+
+class TrackTable:
+    # One row per (frame, track) observation, stored as parallel NumPy columns.
+    # Rows are ordered by frame, so a frame's rows are a contiguous slice.
+
+    def __init__(self, n_frames: int, columns: Dict[str, np.ndarray]) -> None:
+        self.n_frames = n_frames
+        size = len(columns["frame"])
+        for name, (dtype, shape, fill) in COLUMNS.items():
+            if name in columns:
+                setattr(self, name, np.asarray(columns[name], dtype=dtype).reshape((size,) + shape))
+            else:
+                setattr(self, name, np.full((size,) + shape, fill, dtype=dtype))
+        self.frame_offsets = np.searchsorted(self.frame, np.arange(n_frames + 1)).astype(np.int64)
+
+    def __len__(self) -> int:
+        return len(self.frame)
+
+    @classmethod
+    def empty(cls, n_frames: int = 0) -> "TrackTable":
+        return cls(n_frames, {"frame": np.zeros(0, dtype=np.int32)})
+
+    @classmethod
+    def from_tracks(cls, tracks: Dict[str, List[Dict[Any, Any]]]) -> "TrackTable":
+        n_frames = max((len(frames) for frames in tracks.values()), default=0)
+        rows = {name: [] for name in COLUMNS}
+        for frame_idx in range(n_frames):
+            for code, category in enumerate(CATEGORIES):
+                frames = tracks.get(category, [])
+                if frame_idx >= len(frames):
+                    continue
+                for tid, info in frames[frame_idx].items():
+                    rows["frame"].append(frame_idx)
+                    rows["track_id"].append(int(tid))
+                    rows["category"].append(code)
+                    for name, (_, shape, fill) in COLUMNS.items():
+                        if name in ("frame", "track_id", "category"):
+                            continue
+                        value = info.get(name)
+                        if value is None:
+                            value = np.full(shape, fill) if shape else fill
+                        rows[name].append(value)
+        columns = {}
+        for name, (dtype, shape, _) in COLUMNS.items():
+            columns[name] = np.array(rows[name], dtype=dtype).reshape((-1,) + shape)
+        return cls(n_frames, columns)
+
+    def save(self, path: str) -> None:
+        np.savez_compressed(path, n_frames=np.int64(self.n_frames),
+                            **{name: getattr(self, name) for name in COLUMNS})
+
+    @classmethod
+    def load(cls, path: str) -> "TrackTable":
+        # columns missing from older files get their fill value
+        with np.load(path) as data:
+            return cls(int(data["n_frames"]), {name: data[name] for name in COLUMNS if name in data.files})
+
+    def to_tracks(self) -> Dict[str, List[Dict[Any, Any]]]:
+        # compatibility view in the nested {"players": [{tid: {...}}, ...]} shape
+        tracks = {category: [{} for _ in range(self.n_frames)] for category in CATEGORIES}
+        bbox = self.bbox.tolist()
+        conf = self.conf.tolist()
+        position = self.position.tolist()
+        adjusted = self.position_adjusted.tolist()
+        transformed = self.position_transformed.tolist()
+        speed = self.speed.tolist()
+        distance = self.distance.tolist()
+        acceleration = self.acceleration.tolist()
+        has_pos = ~np.isnan(self.position).any(axis=1)
+        has_adj = ~np.isnan(self.position_adjusted).any(axis=1)
+        has_tr = ~np.isnan(self.position_transformed).any(axis=1)
+        has_speed = ~np.isnan(self.speed)
+        has_dist = ~np.isnan(self.distance)
+        has_acc = ~np.isnan(self.acceleration)
+        has_conf = ~np.isnan(self.conf)
+        for i, (frame_idx, tid, code) in enumerate(zip(self.frame.tolist(), self.track_id.tolist(),
+                                                       self.category.tolist())):
+            info = {"bbox": bbox[i]}
+            if has_conf[i]:
+                info["conf"] = conf[i]
+            if has_pos[i]:
+                info["position"] = (int(position[i][0]), int(position[i][1]))
+            if has_adj[i]:
+                info["position_adjusted"] = tuple(adjusted[i])
+            if has_tr[i]:
+                info["position_transformed"] = transformed[i]
+            if has_speed[i]:
+                info["speed"] = speed[i]
+            if has_dist[i]:
+                info["distance"] = distance[i]
+            if has_acc[i]:
+                info["acceleration"] = acceleration[i]
+            if self.team[i]:
+                info["team"] = int(self.team[i])
+            if self.has_ball[i]:
+                info["has_ball"] = True
+            if self.interpolated[i]:
+                info["interpolated"] = True
+            if self.predicted[i]:
+                info["predicted"] = True
+            tracks[CATEGORIES[code]][frame_idx][tid] = info
+        return tracks
+
+    def insert_rows(self, columns: Dict[str, np.ndarray]) -> None:
+        # adds rows in place; within a frame the new rows go after the existing ones
+        size = len(columns["frame"])
+        order = np.argsort(np.concatenate([self.frame, np.asarray(columns["frame"], dtype=np.int32)]),
+                           kind="stable")
+        for name, (dtype, shape, fill) in COLUMNS.items():
+            if name in columns:
+                new = np.asarray(columns[name], dtype=dtype).reshape((size,) + shape)
+            else:
+                new = np.full((size,) + shape, fill, dtype=dtype)
+            setattr(self, name, np.concatenate([getattr(self, name), new])[order])
+        self.frame_offsets = np.searchsorted(self.frame, np.arange(self.n_frames + 1)).astype(np.int64)
+
+    def category_mask(self, category: str) -> np.ndarray:
+        return self.category == CATEGORIES.index(category)
+
+    def frame_slice(self, frame_idx: int) -> slice:
+        return slice(int(self.frame_offsets[frame_idx]), int(self.frame_offsets[frame_idx + 1]))
+
+    def select(self, mask: np.ndarray) -> "TrackTable":
+        return TrackTable(self.n_frames, {name: getattr(self, name)[mask] for name in COLUMNS})
+
+    def track_rows(self, mask: Optional[np.ndarray] = None) -> Dict[int, np.ndarray]:
+        # track_id -> row indices in frame order
+        rows = np.arange(len(self)) if mask is None else np.flatnonzero(mask)
+        if len(rows) == 0:
+            return {}
+        order = rows[np.argsort(self.track_id[rows], kind="stable")]
+        ids, starts = np.unique(self.track_id[order], return_index=True)
+        return dict(zip(ids.tolist(), np.split(order, starts[1:])))
@@ -1,2 +1,3 @@
-from .video_utils import read_video, save_video
-from .bbox_utils import get_center_of_bbox, get_bbox_width, measure_distance,measure_xy_distance,get_foot_position
\ No newline at end of file
+from .video_utils import read_video, iter_video, iter_windows, save_video
+from .bbox_utils import get_center_of_bbox, get_bbox_width, measure_distance,measure_xy_distance,get_foot_position
+from .device_utils import select_device, set_cpu_threads, available_memory, adaptive_batch_size
\ No newline at end of file
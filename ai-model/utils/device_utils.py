@@ -0,0 +1,55 @@
+import os
+from typing import Optional
+
+try:
+    import torch
+except ImportError:
+    torch = None
+
+def select_device(device: Optional[str] = "auto") -> str:
+    # "auto" picks cuda, then Apple mps, then cpu; an explicit cuda request falls back to cpu when no GPU exists
+    if device not in (None, "auto"):
+        if str(device).startswith("cuda") and not (torch is not None and torch.cuda.is_available()):
+            print(f"[WARN] {device} requested but CUDA is not available, using cpu")
+            return "cpu"
+        return str(device)
+    if torch is not None:
+        if torch.cuda.is_available():
+            return "cuda"
+        mps = getattr(torch.backends, "mps", None)
+        if mps is not None and mps.is_available():
+            return "mps"
+    return "cpu"
+
+def set_cpu_threads(threads: Optional[int] = None) -> int:
+    # intra-op threads for torch / OpenCV; defaults to every core this process may use
+    if not threads:
+        threads = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else (os.cpu_count() or 1)
+    if torch is not None:
+        torch.set_num_threads(threads)
+    try:
+        import cv2
+        cv2.setNumThreads(threads)
+    except ImportError:
+        pass
+    return threads
+
+def available_memory(device: str) -> Optional[int]:
+    # free bytes on the device (GPU memory for cuda, physical RAM otherwise); None when unknown
+    if device.startswith("cuda") and torch is not None and torch.cuda.is_available():
+        free, _ = torch.cuda.mem_get_info(torch.device(device))
+        return int(free)
+    try:
+        return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+    except (ValueError, OSError, AttributeError):
+        return None
+
+def adaptive_batch_size(device: str, imgsz: int, bytes_per_pixel: int = 480, memory_fraction: float = 0.5,
+                        min_batch: int = 1, max_batch: int = 64) -> int:
+    # Frames per inference batch that fit in memory_fraction of the free memory. bytes_per_pixel is a rough
+    # peak (input plus activations) per pixel of the letterboxed input; at 640 px it gives 20 frames per 8 GB.
+    free = available_memory(device)
+    if free is None:
+        return 20 if device.startswith("cuda") else 4
+    per_image = bytes_per_pixel * imgsz * imgsz
+    return int(max(min_batch, min(max_batch, free * memory_fraction // per_image)))
@@ -1,5 +1,5 @@
 import cv2
-from typing import List
+from typing import Iterable, Iterator, List
 import numpy as np
 
 def read_video(video_path: str) -> list:
@@ -13,6 +13,27 @@ def read_video(video_path: str) -> list:
     cap.release()
     return frames
 
+def iter_video(video_path: str) -> Iterator[np.ndarray]:
+    cap = cv2.VideoCapture(video_path)
+    try:
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            yield frame
+    finally:
+        cap.release()
+
+def iter_windows(frames: Iterable[np.ndarray], window_size: int) -> Iterator[List[np.ndarray]]:
+    window = []
+    for frame in frames:
+        window.append(frame)
+        if len(window) == window_size:
+            yield window
+            window = []
+    if window:
+        yield window
+
 def save_video(output_frames: list, output_path: str) -> None:
     if not output_frames:
         print("No frames to save.")
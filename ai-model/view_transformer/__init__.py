@@ -1 +1 @@
-from .view_transformer import ViewTransformer
\ No newline at end of file
+from .view_transformer import ViewTransformer, load_calibrations
\ No newline at end of file
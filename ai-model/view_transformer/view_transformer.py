@@ -1,45 +1,97 @@
+import os
+import copy
+import json
 import numpy as np
 import cv2
+import sys
+from functools import lru_cache
+from typing import Dict, Optional, Tuple
+sys.path.append('../')
+from track_table import TrackTable
+
+DEFAULT_CALIBRATION_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "calibrations.json")
+
+@lru_cache(maxsize=8)
+def _load_calibrations(path: str, mtime: float) -> Dict[str, dict]:
+    with open(path) as f:
+        return json.load(f)
+
+def load_calibrations(path: Optional[str] = None) -> Dict[str, dict]:
+    # profile name -> {"resolution": [w, h], "pixel_vertices": [[x, y] * 4], "court_length", "court_width"}
+    path = path or DEFAULT_CALIBRATION_PATH
+    # a copy: the parsed file is cached and shared with the homography cache
+    return copy.deepcopy(_load_calibrations(path, os.path.getmtime(path)))
+
+@lru_cache(maxsize=64)
+def _homography(path: str, mtime: float, profile: str,
+                frame_size: Optional[Tuple[int, int]]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    calibrations = _load_calibrations(path, mtime)
+    if profile not in calibrations:
+        raise KeyError(f"Unknown calibration profile '{profile}'")
+    calibration = calibrations[profile]
+
+    pixel_vertices = np.array(calibration["pixel_vertices"], dtype=np.float32)
+    if frame_size is not None:
+        # vertices are given for the profile's reference resolution; rescale to the input video
+        ref_w, ref_h = calibration["resolution"]
+        pixel_vertices *= np.array([frame_size[0] / ref_w, frame_size[1] / ref_h], dtype=np.float32)
+
+    court_length = float(calibration.get("court_length", 105.0))
+    court_width = float(calibration.get("court_width", 68.0))
+    target_vertices = np.array([
+        [0, court_width],
+        [0, 0],
+        [court_length, 0],
+        [court_length, court_width]
+    ], dtype=np.float32)
+
+    perspective_transform = cv2.getPerspectiveTransform(pixel_vertices, target_vertices)
+    for array in (pixel_vertices, target_vertices, perspective_transform):
+        array.flags.writeable = False
+    return pixel_vertices, target_vertices, perspective_transform
 
 class ViewTransformer:
     
-    def __init__(self) -> None:
-        
-        court_width = 68.0
-        court_length = 105.0
-
-        self.pixel_vertices = np.array([
-            [110, 1035],
-            [265, 275],
-            [910, 260],
-            [1640, 915]
-        ], dtype=np.float32)
-
-        self.target_vertices = np.array([
-            [0, court_width],       
-            [0, 0],                 
-            [court_length, 0],      
-            [court_length, court_width]  
-        ], dtype=np.float32)
-
-        self.perspective_transform = cv2.getPerspectiveTransform(self.pixel_vertices, self.target_vertices)
+    def __init__(self, profile: str = "default", frame_size: Optional[Tuple[int, int]] = None,
+                 calibration_path: Optional[str] = None) -> None:
+        # homographies are cached per (profile, resolution), so building a transformer per request is cheap
+        path = calibration_path or DEFAULT_CALIBRATION_PATH
+        frame_size = tuple(int(v) for v in frame_size) if frame_size is not None else None
+        self.profile = profile
+        self.pixel_vertices, self.target_vertices, self.perspective_transform = _homography(
+            path, os.path.getmtime(path), profile, frame_size
+        )
 
-    def transform_point(self, point: np.ndarray) -> np.ndarray:
-        if point.shape == (2,):
-            point = point.reshape(1, 1, 2).astype(np.float32)
-        elif point.shape == (1, 2):
-            point = point.reshape(1, 1, 2).astype(np.float32)
+    def transform_points(self, points: np.ndarray) -> np.ndarray:
+        # (N, 2) pixel points -> (N, 2) field points with one homography matmul
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        homogeneous = points @ self.perspective_transform[:, :2].T + self.perspective_transform[:, 2]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return homogeneous[:, :2] / homogeneous[:, 2:3]
 
-        transformed = cv2.perspectiveTransform(point, self.perspective_transform)
-        return transformed.reshape(-1)
+    def transform_point(self, point: np.ndarray) -> np.ndarray:
+        # a single point keeps the old flat (2,) result; (N, 2) input gives (N, 2)
+        point = np.asarray(point)
+        transformed = self.transform_points(point)
+        return transformed.reshape(-1) if point.size == 2 else transformed
 
     def add_transformed_position_to_tracks(self, tracks: dict) -> None:
-        for category, frames in tracks.items():
-            for frame_num, track_dict in enumerate(frames):
-                for track_id, info in track_dict.items():
-                    if 'position_adjusted' not in info:
-                        continue
-                    pos_adj = np.array(info['position_adjusted'], dtype=np.float32)
-                    pos_adj = pos_adj.reshape(1, 1, 2)
-                    transformed = cv2.perspectiveTransform(pos_adj, self.perspective_transform)
-                    info['position_transformed'] = transformed[0, 0].tolist()
+        if isinstance(tracks, TrackTable):
+            valid = ~np.isnan(tracks.position_adjusted).any(axis=1)
+            if valid.any():
+                tracks.position_transformed[valid] = self.transform_points(tracks.position_adjusted[valid])
+            return
+
+        # gather every adjusted point, transform them in one call, then scatter back
+        infos = [
+            info
+            for frames in tracks.values()
+            for track_dict in frames
+            for info in track_dict.values()
+            if 'position_adjusted' in info
+        ]
+        if not infos:
+            return
+        points = np.array([info['position_adjusted'] for info in infos], dtype=np.float64)
+        for info, transformed in zip(infos, self.transform_points(points).tolist()):
+            info['position_transformed'] = transformed
@@ -3,10 +3,19 @@
 import React, { useState } from 'react'
 import { motion } from 'framer-motion'
 
+type LivePlayer = {
+  id: number
+  track_id: number
+  overall: number
+  value: number
+}
+
 export default function Home() {
   const [uploading, setUploading] = useState(false)
   const [streaming, setStreaming] = useState(false)
   const [message, setMessage] = useState('')
+  const [jobId, setJobId] = useState<string | null>(null)
+  const [livePlayers, setLivePlayers] = useState<LivePlayer[]>([])
 
   const API_URL = process.env.NEXT_PUBLIC_API_URL || 'http://localhost:8000'
 
@@ -14,6 +23,8 @@ export default function Home() {
     e.preventDefault()
     setUploading(true)
     setMessage('')
+    setLivePlayers([])
+    let live: EventSource | null = null
 
     const form = new FormData(e.currentTarget)
     const file = form.get('file') as File
@@ -29,10 +40,31 @@ export default function Home() {
         body: form,
       })
       if (!res.ok) throw new Error()
+      const { job_id } = await res.json()
+
+      // provisional ratings are pushed while the video is being analyzed
+      live = new EventSource(`${API_URL}/jobs/${job_id}/live`)
+      live.addEventListener('players', (event) => {
+        setLivePlayers(JSON.parse((event as MessageEvent).data))
+      })
+
+      // processing runs in the background; poll until the job finishes
+      while (true) {
+        await new Promise((resolve) => setTimeout(resolve, 2000))
+        const statusRes = await fetch(`${API_URL}/jobs/${job_id}`, { cache: 'no-store' })
+        if (!statusRes.ok) throw new Error()
+        const job = await statusRes.json()
+        if (job.status === 'failed') throw new Error()
+        if (job.status === 'done') break
+        if (job.stage) setMessage(`⏳ ${job.stage.replace(/_/g, ' ')}…`)
+      }
+      setMessage('')
+      setJobId(job_id)
       setStreaming(true)
     } catch {
       setMessage('❌ Failed to upload — try again')
     } finally {
+      live?.close()
       setUploading(false)
     }
   }
@@ -102,6 +134,20 @@ export default function Home() {
             {uploading ? 'Analyzing...' : 'Analyze'}
           </motion.button>
 
+          {uploading && livePlayers.length > 0 && (
+            <ul className="text-sm text-gray-300 space-y-1">
+              <li className="font-semibold text-white">Live ratings</li>
+              {livePlayers.slice(0, 5).map((p) => (
+                <li key={p.track_id} className="flex justify-between">
+                  <span>Player {p.track_id}</span>
+                  <span>
+                    {p.overall} · {p.value.toLocaleString()} SAR
+                  </span>
+                </li>
+              ))}
+            </ul>
+          )}
+
           {message && (
             <motion.div
               initial={{ opacity: 0 }}
@@ -123,7 +169,7 @@ export default function Home() {
         >
           <h2 className="text-white text-2xl">Processing Video…</h2>
           <img
-            src={`${API_URL}/video_feed`}
+            src={`${API_URL}/video_feed?job_id=${jobId}`}
             alt="Live processing"
             className="max-w-full max-h-[60vh] border-4 border-gray-700 rounded-lg object-contain"
           />